@@ -0,0 +1,29 @@
+# Structured-output schema for the agents, with local repair
+# What this file contains:
+# - RepairingOutputSchema: AgentOutputSchema whose validate_json() falls back to app/schemas/repair.py when
+#   the model's JSON does not validate (fences, truncation, "0.6" for a float, a title over max_length, ...).
+#   If repair fails too, the SDK's ModelBehaviorError is raised with `raw_output` / `repair_error` attached,
+#   so the engine can send a corrective re-prompt
+# - record_repairs(): per-field repair counters
+
+from agents import AgentOutputSchema, ModelBehaviorError
+from app.schemas.repair import RepairFailed, repair
+from app.utils.metrics import SCHEMA_REPAIRS
+
+def record_repairs(schema: type, repairs: list[tuple[str, str]]):
+    for field, kind in repairs:
+        SCHEMA_REPAIRS.inc(schema=schema.__name__, field=field, kind=kind)
+
+class RepairingOutputSchema(AgentOutputSchema):
+    def validate_json(self, json_str: str):
+        try:
+            return super().validate_json(json_str)
+        except ModelBehaviorError as e:
+            try:
+                value, repairs = repair(json_str, self.output_type)
+            except RepairFailed as failed:
+                e.raw_output = json_str
+                e.repair_error = str(failed)
+                raise e
+            record_repairs(self.output_type, repairs)
+            return value
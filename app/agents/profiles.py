@@ -0,0 +1,135 @@
+# Agent model profiles (model, reasoning effort, output cap, timeout per agent)
+# What this file contains:
+# - AgentConfig: per-agent run settings
+# - PROFILES: built-in "baseline" / "fast" / "balanced" / "deep" profiles, optionally extended or overridden by
+#   AGENT_PROFILES_FILE (TOML, or YAML if PyYAML is installed). "baseline" (the default AGENT_PROFILE) runs
+#   every agent as before profiles existed: gpt-5, the model's default reasoning effort, no timeout
+# - AgentTimeout: raised by the engine when an agent exceeds its profile's timeout_s
+# - current_profile: the profile of the running workflow (context variable, like progress.current_run)
+# - apply(): an agent re-configured for the current profile; the engine's _run() calls it for every agent
+#
+# File format (TOML shown; YAML uses the same nesting). "default" applies to every agent of the profile;
+# agent keys are the agent names in lower case (classifier, legal, ..., formatter):
+#   [profiles.cheap.default]
+#   model = "gpt-5-mini"
+#   reasoning_effort = "low"
+#   [profiles.cheap.combiner]
+#   model = "gpt-5"
+#   timeout_s = 120
+
+import json
+import os
+import tomllib
+from contextvars import ContextVar
+from typing import Literal
+from agents import Agent, ModelSettings
+from openai.types.shared import Reasoning
+from pydantic import BaseModel
+from app.core.config import settings
+
+class AgentConfig(BaseModel):
+    model: str = "gpt-5"
+    reasoning_effort: Literal["minimal", "low", "medium", "high"] | None = None  # None: model default
+    max_output_tokens: int | None = None
+    timeout_s: float | None = None
+
+    def merged(self, overrides: dict) -> "AgentConfig":
+        return self.model_copy(update=overrides)
+
+class AgentTimeout(TimeoutError):
+    """An agent run exceeded its profile's timeout_s (as opposed to a role's hard deadline)."""
+    def __init__(self, agent: str, timeout_s: float):
+        super().__init__(f"{agent} exceeded its profile timeout of {timeout_s:g}s")
+        self.agent = agent
+        self.timeout_s = timeout_s
+
+# Agents whose key differs from their lower-cased name share another agent's settings
+_KEY_ALIASES = {"classifierbatch": "classifier"}
+_LIGHT = ("classifier", "formatter", "followup")  # small structured jobs; the cheapest settings do
+
+PROFILES: dict[str, dict[str, dict]] = {
+    "baseline": {"default": {}},
+    "fast": {
+        "default": {"model": "gpt-5-mini", "reasoning_effort": "low", "max_output_tokens": 3000, "timeout_s": 90},
+        **{k: {"model": "gpt-5-nano", "reasoning_effort": "minimal", "timeout_s": 30} for k in _LIGHT},
+    },
+    "balanced": {
+        "default": {"model": "gpt-5", "reasoning_effort": "medium", "timeout_s": 240},
+        **{k: {"model": "gpt-5-mini", "reasoning_effort": "low", "timeout_s": 60} for k in _LIGHT},
+    },
+    "deep": {
+        "default": {"model": "gpt-5", "reasoning_effort": "high", "timeout_s": 480},
+        **{k: {"model": "gpt-5", "reasoning_effort": "low", "timeout_s": 90} for k in _LIGHT},
+    },
+}
+
+def _load_file(path: str) -> dict:
+    with open(path, "rb") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError as e:
+                raise RuntimeError(f"{path}: YAML profiles need PyYAML (pip install pyyaml) or use TOML") from e
+            data = yaml.safe_load(f) or {}
+        elif path.endswith(".json"):
+            data = json.load(f)
+        else:
+            data = tomllib.load(f)
+    return data.get("profiles", data)
+
+def load_profiles(path: str | None) -> dict[str, dict[str, AgentConfig]]:
+    """Built-in profiles merged with the file's (file entries override per agent and field)."""
+    raw = {name: {k: dict(v) for k, v in agents.items()} for name, agents in PROFILES.items()}
+    if path and os.path.exists(path):
+        for name, agents in _load_file(path).items():
+            profile = raw.setdefault(name, {})
+            for key, fields in (agents or {}).items():
+                profile.setdefault(key, {}).update(fields or {})
+    elif path:
+        raise FileNotFoundError(f"AGENT_PROFILES_FILE not found: {path}")
+    resolved = {}
+    for name, agents in raw.items():
+        default = AgentConfig(**agents.get("default", {}))
+        resolved[name] = {"default": default, **{k: default.merged(v) for k, v in agents.items() if k != "default"}}
+    return resolved
+
+profiles = load_profiles(settings.AGENT_PROFILES_FILE)
+if settings.AGENT_PROFILE not in profiles:
+    raise ValueError(f"AGENT_PROFILE={settings.AGENT_PROFILE!r} is not a known profile: {sorted(profiles)}")
+
+# (profile name, models used so far in this run: agent key → config) for the running workflow
+current_profile: ContextVar[tuple[str, dict[str, dict]] | None] = ContextVar("current_profile", default=None)
+
+def agent_key(agent: Agent) -> str:
+    key = agent.name.lower()
+    return _KEY_ALIASES.get(key, key)
+
+def config_for(profile: str, agent: Agent) -> AgentConfig:
+    agents = profiles[profile]
+    return agents.get(agent_key(agent), agents["default"])
+
+_configured: dict[tuple[str, int], Agent] = {}
+
+def note(agent: Agent) -> tuple[str, AgentConfig]:
+    """Resolve the agent's config for the current profile and record it in the run's model list."""
+    state = current_profile.get()
+    name = state[0] if state else settings.AGENT_PROFILE
+    cfg = config_for(name, agent)
+    if state:
+        state[1][agent_key(agent)] = cfg.model_dump(exclude_none=True)
+    return name, cfg
+
+def apply(agent: Agent) -> tuple[Agent, AgentConfig]:
+    """The agent with the current profile's model settings (clones are cached), plus its config."""
+    name, cfg = note(agent)
+    cache_key = (name, id(agent))
+    configured = _configured.get(cache_key)
+    if configured is None:
+        configured = _configured[cache_key] = agent.clone(
+            model=cfg.model,
+            model_settings=agent.model_settings.resolve(ModelSettings(
+                reasoning=Reasoning(effort=cfg.reasoning_effort) if cfg.reasoning_effort else None,
+                max_tokens=cfg.max_output_tokens,
+            )),
+        )
+    return configured, cfg
@@ -1,17 +1,21 @@
 # Agents SDK agent definitions
 # What this file contains:
-# - Agent objects (Classifier, Legal, Marketing, Operations, Strategy, Analyst, Finance, Debate, Combiner, Formatter)
+# - Agent objects (Classifier, ClassifierBatch, Legal, Marketing, Operations, Strategy, Analyst, Finance, Debate, Combiner, Formatter, Followup)
 # - Each role agent uses tool calling to pull role-private context (function tools defined in app/tools/retrieval.py)
 # - Instructions mirror your original workflow
+# - Structured outputs go through RepairingOutputSchema (app/agents/output.py): invalid JSON is repaired locally
+# - model= here is only a fallback: each run's profile (app/agents/profiles.py) sets the model and reasoning effort
 
 from agents import Agent
-from app.schemas.classifier import ClassifierSchema
+from app.agents.output import RepairingOutputSchema
+from app.schemas.classifier import BatchClassifierSchema, ClassifierSchema
 from app.schemas.roles import (
     LegalSchema, MarketingSchema, OperationsSchema,
     StrategySchema, AnalystSchema, FinanceSchema
 )
 from app.schemas.debate import AddDebateSchema
 from app.schemas.combined import CombinerSchema, FormatterSchema
+from app.schemas.followup import FollowupSchema
 from app.tools.retrieval import (
     legal_retrieval, marketing_retrieval, ops_retrieval,
     strategy_retrieval, analyst_retrieval, finance_retrieval
@@ -86,7 +90,7 @@ Rules:
 - Document runway_sensitivity (how changes in burn affect timeline).
 Return strict JSON only."""
 
-DEBATE_SYS = """You are the Moderator (COO/Chief-of-Staff). Critique the six role JSONs in `answers`.
+DEBATE_SYS = """You are the Moderator (COO/Chief-of-Staff). Critique the role JSONs in `answers` (only the roles routed for this question).
 Find contradictions, assumptions, compliance blockers, and data gaps. Propose concrete next steps. Down-rank claims with empty sources[]. Mark them "assumption". Prefer well-cited contributions.
 Return JSON only using the schema provided."""
 
@@ -123,13 +127,22 @@ Rules:
 - Dates default to 14 days from now if 'due' missing (format: '14d' or ISO date).
 - Return MINIFIED JSON ONLY."""
 
+FOLLOWUP_SYS = """You are the Zylox Follow-up Router. Input: a previous question, the roles that answered it (each with a one-line summary) and a follow-up question. Decide what must be redone. Rules: rewrite the follow-up as a 'standalone_question' that includes the needed context from the previous question; list in 'regenerate' only the roles whose previous answer would materially change (a narrower scope, new market, new constraint or new data that touches that role); set 'reclassify' true only if the balance between roles shifts; one-sentence 'reason'. When unsure whether a role is affected, regenerate it. Return strict JSON only."""
+
 # Agent definitions (Agents SDK). Tools: function tools from retrieval.py
 classifier_agent = Agent(
     name="Classifier",
     instructions=CLASSIFIER_SYS,
     model="gpt-5",
     tools=[],
-    output_type=ClassifierSchema
+    output_type=RepairingOutputSchema(ClassifierSchema)
+)
+
+# Same router, several questions per call (/ask/batch)
+classifier_batch_agent = classifier_agent.clone(
+    name="ClassifierBatch",
+    instructions=CLASSIFIER_SYS + """ You will receive a numbered list of questions. Classify each one independently and return {"items":[...]} with exactly one entry per question, in the same order.""",
+    output_type=RepairingOutputSchema(BatchClassifierSchema)
 )
 
 legal_agent = Agent(
@@ -137,7 +150,7 @@ legal_agent = Agent(
     instructions=LEGAL_SYS,
     model="gpt-5",
     tools=[legal_retrieval],
-    output_type=LegalSchema
+    output_type=RepairingOutputSchema(LegalSchema)
 )
 
 marketing_agent = Agent(
@@ -145,7 +158,7 @@ marketing_agent = Agent(
     instructions=MARKETING_SYS,
     model="gpt-5",
     tools=[marketing_retrieval],
-    output_type=MarketingSchema
+    output_type=RepairingOutputSchema(MarketingSchema)
 )
 
 ops_agent = Agent(
@@ -153,7 +166,7 @@ ops_agent = Agent(
     instructions=OPS_SYS,
     model="gpt-5",
     tools=[ops_retrieval],
-    output_type=OperationsSchema
+    output_type=RepairingOutputSchema(OperationsSchema)
 )
 
 strategy_agent = Agent(
@@ -161,7 +174,7 @@ strategy_agent = Agent(
     instructions=STRATEGY_SYS,
     model="gpt-5",
     tools=[strategy_retrieval],
-    output_type=StrategySchema
+    output_type=RepairingOutputSchema(StrategySchema)
 )
 
 analyst_agent = Agent(
@@ -169,7 +182,7 @@ analyst_agent = Agent(
     instructions=ANALYST_SYS,
     model="gpt-5",
     tools=[analyst_retrieval],
-    output_type=AnalystSchema
+    output_type=RepairingOutputSchema(AnalystSchema)
 )
 
 finance_agent = Agent(
@@ -177,7 +190,7 @@ finance_agent = Agent(
     instructions=FINANCE_SYS,
     model="gpt-5",
     tools=[finance_retrieval],
-    output_type=FinanceSchema
+    output_type=RepairingOutputSchema(FinanceSchema)
 )
 
 debate_agent = Agent(
@@ -185,7 +198,7 @@ debate_agent = Agent(
     instructions=DEBATE_SYS,
     model="gpt-5",
     tools=[],
-    output_type=AddDebateSchema
+    output_type=RepairingOutputSchema(AddDebateSchema)
 )
 
 combiner_agent = Agent(
@@ -193,7 +206,7 @@ combiner_agent = Agent(
     instructions=COMBINER_SYS,
     model="gpt-5",
     tools=[],
-    output_type=CombinerSchema
+    output_type=RepairingOutputSchema(CombinerSchema)
 )
 
 formatter_agent = Agent(
@@ -201,6 +214,13 @@ formatter_agent = Agent(
     instructions=FORMATTER_SYS,
     model="gpt-5",
     tools=[],
-    output_type=FormatterSchema
+    output_type=RepairingOutputSchema(FormatterSchema)
 )
 
+followup_agent = Agent(
+    name="Followup",
+    instructions=FOLLOWUP_SYS,
+    model="gpt-5",
+    tools=[],
+    output_type=RepairingOutputSchema(FollowupSchema)
+)
@@ -5,6 +5,7 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     OPENAI_ORG_ID: str | None = None
     OPENAI_PROJECT_ID: str | None = None
+    OPENAI_BASE_URL: str | None = None  # e.g. the local fake server in bench/ (http://127.0.0.1:8100/v1)
 
     VECTOR_STORE_LEGAL: str
     VECTOR_STORE_MARKETING: str
@@ -19,6 +20,137 @@ class Settings(BaseSettings):
     CORS_ALLOW_ORIGINS: str = "*"
     LOG_LEVEL: str = "INFO"
 
+    # Agent model profiles (app/agents/profiles.py): built-in "baseline" | "fast" | "balanced" | "deep", per-request override on /ask
+    AGENT_PROFILE: str = "baseline"
+    AGENT_PROFILES_FILE: str | None = None  # TOML/YAML/JSON file adding or overriding profiles
+
+    # Role routing: "all" | "top_k" | "threshold" (per-request override on /ask)
+    ROUTING_MODE: str = "all"
+    ROUTING_WEIGHT_FLOOR: float = 15.0  # min normalized weight (0–100) for "threshold" mode
+
+    # Local fast-path router (app/workflow/local_router.py): kNN over past Classifier outputs from the ledger;
+    # only questions without a close, consistent match call the Classifier agent
+    ROUTER_ENABLED: bool = True
+    ROUTER_DIR: str = "data/router"  # versioned index dirs + "current" symlink, written by `train`
+    ROUTER_K: int = 5  # neighbours averaged per prediction
+    ROUTER_MIN_SIMILARITY: float = 0.6  # best neighbour's TF-IDF cosine similarity needed to answer locally
+    ROUTER_MAX_SPREAD: float = 8.0  # max mean absolute weight difference (points of 100) of a neighbour from the prediction
+    ROUTER_MIN_EXAMPLES: int = 50  # distinct past questions needed before `train` writes an index
+
+    # Progress event bus / SSE
+    EVENT_BUFFER_SIZE: int = 256  # events kept per run for Last-Event-ID replay
+    EVENT_RETENTION_S: float = 900  # how long a finished run's events stay replayable
+    EVENT_MAX_CHANNELS: int = 2000  # channels kept in memory; past it the oldest finished runs are dropped early
+    SSE_HEARTBEAT_S: float = 15
+
+    # Semantic answer cache (exact normalized match, then embedding similarity)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_TTL_S: float = 6 * 3600
+    ANSWER_CACHE_DEGRADED_TTL_S: float = 0  # answers with timed-out/failed roles (0 = not cached)
+    ANSWER_CACHE_MAX_ENTRIES: int = 20000
+    ANSWER_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # cosine similarity needed for a near-hit
+    ANSWER_CACHE_EMBED_MODEL: str = "text-embedding-3-small"
+    ANSWER_CACHE_EMBED_DIM: int = 256
+
+    # "tools": role agents call their retrieval function tool themselves (default, per the build rules)
+    # "prefetch" (opt-in): search the role stores up front and inject the context (one model turn per role)
+    RETRIEVAL_MODE: str = "tools"
+
+    # Role deadlines: past the soft deadline a hedged duplicate call starts (first answer wins);
+    # past the hard deadline, or on failure, the role is dropped and debate/combine go on without it
+    ROLE_SOFT_DEADLINE_S: float | None = 60  # None disables hedging
+    ROLE_HARD_DEADLINE_S: float | None = 150  # None: wait for the role indefinitely
+    ROLE_DEADLINES_S: dict[str, tuple[float | None, float | None]] = {}  # per-role (soft, hard) overrides, e.g. {"analyst": [90, 200]}
+
+    # Role-answer digests for the debate/combine prompts (~4 chars per token estimate)
+    COMPACT_ENABLED: bool = True
+    COMPACT_ROLES_TOKENS: int = 2500  # all role digests together; split by classifier weight
+    COMPACT_MIN_SHARE: float = 0.05  # smallest budget share any role that ran gets
+    COMPACT_DEBATE_TOKENS: int = 1200  # debate JSON handed to the combiner
+
+    # Final formatting: "local" (deterministic), "llm" (Formatter agent), "hybrid" (local, agent only if local fails)
+    FORMATTER_MODE: str = "hybrid"
+
+    # Agent output that fails its schema is repaired locally; if that fails, re-prompt the agent once with the errors
+    SCHEMA_REPROMPT: bool = True
+
+    # Token streaming: Combiner / Formatter answer fields published as "{stage}:delta" progress events while generating
+    STREAM_TOKENS: bool = True
+    STREAM_FLUSH_MS: float = 100  # delta events per field are batched to at most one per interval
+
+    # Async job API (/ask/jobs)
+    JOB_WORKERS: int = 4  # workflows run concurrently by the job pool
+    JOB_QUEUE_DEPTH: int = 100  # queued jobs beyond this get 503 + Retry-After
+    JOB_RESULT_TTL_S: float = 3600  # how long finished jobs stay pollable
+
+    # Follow-ups (/ask/followup): finished runs retained for refinement
+    SESSION_TTL_S: float = 2 * 3600
+    SESSION_MAX_RUNS: int = 2000
+
+    # Run ledger (app/services/ledger.py): every stage output persisted as it completes; /ask/runs/{id}/resume
+    LEDGER_ENABLED: bool = True
+    LEDGER_PATH: str = "data/ledger.sqlite3"
+    LEDGER_RETENTION_S: float = 30 * 24 * 3600
+    LEDGER_MAX_RUNS: int = 100_000  # oldest runs beyond this are pruned
+    LEDGER_PRUNE_EVERY: int = 1000  # new runs between retention passes (also run at startup)
+
+    # Per-run span tracing (app/utils/tracing.py): Agents SDK spans + stage/search spans, written locally
+    # (the hosted trace exporter is not used); GET /ask/runs/{id}/trace
+    TRACE_ENABLED: bool = True
+    TRACE_SAMPLE_RATE: float = 0.1  # share of runs traced (0–1); unsampled runs record nothing
+    TRACE_DIR: str = "data/traces"  # one {run_id}.jsonl per traced run
+    TRACE_MAX_RUNS: int = 5000  # newest trace files kept
+    TRACE_FIELD_CHARS: int = 1000  # span attributes (tool input/output, …) cut to this many characters
+
+    # Idempotency-Key on /ask and /ask/stream: retries within the window get the first request's run
+    IDEMPOTENCY_TTL_S: float = 600
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+
+    # Batch API (/ask/batch)
+    BATCH_MAX_QUESTIONS: int = 500
+    BATCH_CONCURRENCY: int = 8  # default workflows in flight per batch (request may lower/raise up to the max)
+    BATCH_MAX_CONCURRENCY: int = 32
+    BATCH_CLASSIFY_SIZE: int = 10  # questions per ClassifierBatch call; 1 disables batched classification
+
+    # OpenAI concurrency governor (every model / vector-store call goes through it)
+    LIMITER_MODEL_CONCURRENCY: int = 32
+    LIMITER_SEARCH_CONCURRENCY: int = 32
+    LIMITER_RPM: int = 500
+    LIMITER_TPM: int = 2_000_000
+    LIMITER_DEFAULT_OUTPUT_TOKENS: int = 4000  # TPM reservation when a call sets no output cap
+    LIMITER_MAX_RETRIES: int = 4  # retries on 429/5xx/connection errors before giving up
+    LIMITER_BACKOFF_BASE_S: float = 1.0
+    LIMITER_BACKOFF_MAX_S: float = 30.0
+
+    # Shared OpenAI HTTP pool (app/services/openai_client.py), opened and warmed in the app lifespan
+    HTTP_POOL_SIZE: int = 0  # 0 = size from workflow fan-out × HTTP_EXPECTED_CONCURRENCY, capped by the governor lanes
+    HTTP_EXPECTED_CONCURRENCY: int = 4  # workflows expected in flight at once
+    HTTP_KEEPALIVE_S: float = 120  # idle connections kept this long (bursty traffic re-uses warm TLS sessions)
+    HTTP2: bool = True  # used only if the h2 package is installed
+    HTTP_WARMUP_CONNECTIONS: int = 8  # connections opened at startup before /ready reports ready
+
+    # Post-retrieval (app/tools/rerank.py): wide candidate set → shingle dedup → BM25 rerank → per-role budget
+    RETRIEVAL_CANDIDATES: int = 20  # passages fetched per search
+    RETRIEVAL_BUDGET_CHARS: int = 4000  # role context kept per search (~1000 tokens)
+    RETRIEVAL_ROLE_BUDGET_CHARS: dict[str, int] = {}  # per-role overrides, e.g. {"legal": 6000}
+    RETRIEVAL_DEDUP_THRESHOLD: float = 0.8  # shingle overlap (of the smaller chunk) that marks a duplicate
+    RETRIEVAL_BM25_WEIGHT: float = 0.7  # rank = weight × BM25 + (1 − weight) × store score (both scaled to 0–1)
+
+    # Vector store search cache (per store, keyed on query + k)
+    RETRIEVAL_CACHE_TTL_S: float = 600
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 2048
+
+    # Retrieval backend: "hosted" (Vector Stores search) | "mirror" (local mmap index, hosted fallback)
+    RETRIEVAL_BACKEND: str = "hosted"
+    MIRROR_DIR: str = "data/mirror"
+    MIRROR_MAX_AGE_S: float = 24 * 3600  # older mirrors are ignored (→ hosted search) until re-synced
+    MIRROR_EMBED_MODEL: str = "text-embedding-3-small"
+    MIRROR_CHUNK_CHARS: int = 2400
+    MIRROR_CHUNK_OVERLAP: int = 400
+    MIRROR_SEARCH_BLOCK_ROWS: int = 65536  # rows scored per matmul block
+    MIRROR_KEEP_VERSIONS: int = 2
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
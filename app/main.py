@@ -1,19 +1,81 @@
 # FastAPI entrypoint
 # What this file contains:
 # - FastAPI app
-# - /health and /ask endpoints
+# - Lifespan: opens the shared OpenAI HTTP pool, starts job workers, warms connections; closes them on shutdown
+# - /health (liveness), /ready (readiness: warm-up done) and /ask endpoints (identical concurrent requests coalesce; Idempotency-Key replays)
+# - /ask/stream: Server-Sent Events fed by the progress event bus (replay via Last-Event-ID)
+# - /ask/jobs: async job submission + polling on a bounded worker pool
+# - /ask/followup: refine a previous run, reusing the role outputs the follow-up doesn't change
+# - /ask/batch: many questions in one request, deduplicated, results streamed as NDJSON
+# - /ask/runs: run ledger (checkpointed stage outputs): inspect, resume a failed run, bulk export; trace waterfall
+# - /metrics (Prometheus), /limits (OpenAI governor state), /router (local router share) and /profiles (agent model profiles)
 # - Wires request to workflow engine
 
+import asyncio
+import json
 import logging
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from typing import Literal
+from pydantic import BaseModel, Field
+from app.agents import profiles
 from app.core.config import settings
-from app.workflow.engine import run_workflow
+from app.services.answer_cache import variant_key
+from app.services.coalesce import IdempotencyConflict, coalesced_run, idempotent, start_or_attach
+from app.services.batch import run_batch
+from app.services.jobs import QueueFull, jobs
+from app.services.ledger import ledger, parse_since
+from app.services.limiter import governor, quota_exhausted
+from app.services import openai_client
+from app.utils import tracing
+from app.utils.metrics import registry
+from app.utils.progress import bus
+from app.workflow import local_router
+from app.workflow.engine import run_workflow, start_workflow
+from app.workflow.followup import UnknownRun, run_followup
+from app.workflow.resume import RunFinished, RunInProgress, resume_run
 
 logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL.upper(), "INFO"))
 
-app = FastAPI(title="Zylox Ask Engine (Agents SDK)", version="0.2.0")
+log = logging.getLogger("main")
+
+# Startup warm-up state for /ready
+_warmup: dict = {"ready": False}
+
+async def _warm_up():
+    try:
+        _warmup.update(await openai_client.warm_up())
+        if settings.RETRIEVAL_BACKEND == "mirror":
+            from app.tools.mirror import get_index
+            from app.tools.retrieval import ROLE_RETRIEVAL
+            stores = [getattr(settings, store_setting) for store_setting, _ in ROLE_RETRIEVAL.values()]
+            loaded = await asyncio.gather(*(asyncio.to_thread(get_index, s) for s in stores if s))
+            _warmup["mirrors"] = sum(index is not None for index in loaded)
+    except Exception as e:  # never block readiness on warm-up; the first requests just pay the handshakes
+        log.warning("Warm-up failed: %s", e)
+        _warmup["error"] = str(e)
+    _warmup["ready"] = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    openai_client.open_client()
+    ledger.prune()
+    jobs.start()
+    warm = asyncio.create_task(_warm_up())
+    try:
+        yield
+    finally:
+        warm.cancel()
+        await jobs.stop()
+        await ledger.close()
+        await asyncio.get_running_loop().run_in_executor(None, tracing.processor.force_flush)
+        await openai_client.close_client()
+        _warmup.clear()
+        _warmup["ready"] = False
+
+app = FastAPI(title="Zylox Ask Engine (Agents SDK)", version="0.2.0", lifespan=lifespan)
 
 # CORS configuration
 # Note: allow_credentials=True cannot be used with allow_origins=["*"]
@@ -43,11 +105,69 @@ app.add_middleware(
 
 class AskRequest(BaseModel):
     question: str
+    # Role routing override; defaults to settings.ROUTING_MODE
+    routing: Literal["all", "top_k", "threshold"] | None = None
+    # Agent model profile ("baseline" / "fast" / "balanced" / "deep" or one from AGENT_PROFILES_FILE); defaults to settings.AGENT_PROFILE
+    profile: str | None = None
+
+class JobRequest(AskRequest):
+    priority: Literal["interactive", "batch"] = "interactive"
+
+class FollowupRequest(BaseModel):
+    run_id: str  # the run being refined (any finished run still in the session store)
+    question: str
+    # Default to the parent run's routing / profile
+    routing: Literal["all", "top_k", "threshold"] | None = None
+    profile: str | None = None
+
+class BatchRequest(BaseModel):
+    questions: list[str]
+    routing: Literal["all", "top_k", "threshold"] | None = None
+    profile: str | None = None
+    # Workflows in flight for this batch; defaults to settings.BATCH_CONCURRENCY
+    concurrency: int | None = Field(default=None, ge=1)
+
+def _profile(name: str | None) -> str:
+    name = name or settings.AGENT_PROFILE
+    if name not in profiles.profiles:
+        raise HTTPException(status_code=400, detail=f"Unknown profile '{name}'; available: {sorted(profiles.profiles)}")
+    return name
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready(response: Response):
+    """Readiness: 503 until the OpenAI connection pool has been warmed (for load balancer checks)."""
+    if not _warmup["ready"]:
+        response.status_code = 503
+    return {"status": "ready" if _warmup["ready"] else "warming", "warmup": _warmup,
+            "pool": {"connections": openai_client.pool_size(), "http2": openai_client.http2_enabled()}}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition: stage/role/agent latency, token counts, search stats, cache ratios."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/profiles")
+async def list_profiles():
+    """Agent model profiles: per-agent model, reasoning effort, output cap and timeout."""
+    return {
+        "default": settings.AGENT_PROFILE,
+        "profiles": {name: {k: c.model_dump(exclude_none=True) for k, c in agents.items()} for name, agents in profiles.profiles.items()},
+    }
+
+@app.get("/limits")
+async def limits():
+    """Current OpenAI governor state: per-lane concurrency, retries/429s and RPM/TPM bucket levels."""
+    return governor.stats()
+
+@app.get("/router")
+async def router_stats():
+    """Local fast-path router: classifier decisions by source, the share served locally, and the loaded index."""
+    return local_router.stats()
+
 @app.post("/ask-test")
 async def ask_test(req: AskRequest):
     """Mock endpoint for testing frontend without using OpenAI credits"""
@@ -139,39 +259,236 @@ async def ask_test(req: AskRequest):
         }
     }
 
+def _workflow_error(e: Exception) -> HTTPException:
+    """Map a workflow failure to the HTTP error the client sees."""
+    error_type = type(e).__name__
+    error_msg = str(e)
+    
+    # Handle OpenAI-specific errors (quota first: it arrives as a 429 RateLimitError)
+    if quota_exhausted(e):
+        return HTTPException(
+            status_code=402,
+            detail="Insufficient OpenAI credits. Please add credits to your account."
+        )
+    elif "RateLimitError" in error_type or "429" in error_msg:
+        return HTTPException(
+            status_code=429,
+            detail="OpenAI API quota exceeded. Please check your billing and plan."
+        )
+    elif "AuthenticationError" in error_type or "401" in error_msg:
+        return HTTPException(
+            status_code=401,
+            detail="OpenAI API authentication failed. Check your API key."
+        )
+    elif "PermissionDeniedError" in error_type:
+        return HTTPException(
+            status_code=403,
+            detail="OpenAI API key lacks permission for this model or resource."
+        )
+    else:
+        # Log the full error for debugging
+        logging.error(f"Workflow error: {error_type}: {error_msg}")
+        return HTTPException(
+            status_code=500,
+            detail=f"Internal error: {error_type}"
+        )
+
 @app.post("/ask")
-async def ask(req: AskRequest):
+async def ask(req: AskRequest, response: Response, idempotency_key: str | None = Header(default=None)):
     q = (req.question or "").strip()
     if not q:
         raise HTTPException(status_code=400, detail="Missing 'question'")
     
+    profile = _profile(req.profile)
     try:
-        return await run_workflow(q)
-    except Exception as e:
-        error_type = type(e).__name__
-        error_msg = str(e)
-        
-        # Handle OpenAI-specific errors
-        if "RateLimitError" in error_type or "429" in error_msg:
-            raise HTTPException(
-                status_code=429,
-                detail="OpenAI API quota exceeded. Please check your billing and plan."
-            )
-        elif "AuthenticationError" in error_type or "401" in error_msg:
-            raise HTTPException(
-                status_code=401,
-                detail="OpenAI API authentication failed. Check your API key."
-            )
-        elif "insufficient_quota" in error_msg:
-            raise HTTPException(
-                status_code=402,
-                detail="Insufficient OpenAI credits. Please add credits to your account."
-            )
+        routing = req.routing or settings.ROUTING_MODE
+        variant = variant_key(routing, profile)
+        # Identical concurrent requests share one run; a retried Idempotency-Key gets the first request's run
+        call = lambda: coalesced_run(q, variant, lambda: run_workflow(q, routing=routing, profile=profile))
+        if idempotency_key:
+            (result, cache_status, joined), replayed = await idempotent(idempotency_key, q, variant, call)
+            response.headers["Idempotent-Replayed"] = str(replayed).lower()
         else:
-            # Log the full error for debugging
-            logging.error(f"Workflow error: {error_type}: {error_msg}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Internal error: {error_type}"
-            )
+            result, cache_status, joined = await call()
+        response.headers["X-Answer-Cache"] = cache_status
+        response.headers["X-Coalesced"] = str(joined).lower()
+        return result
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise _workflow_error(e)
+
+@app.post("/ask/followup")
+async def ask_followup(req: FollowupRequest):
+    """Refine a previous run: role outputs the follow-up doesn't affect are reused; `followup` says which."""
+    q = (req.question or "").strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="Missing 'question'")
+    profile = _profile(req.profile) if req.profile else None
+    try:
+        return await run_followup(req.run_id, q, routing=req.routing, profile=profile)
+    except UnknownRun as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise _workflow_error(e)
+
+@app.get("/ask/runs/export")
+async def export_runs(since: str | None = None, status: Literal["running", "ok", "error"] | None = None):
+    """Every retained run with its stage outputs, one JSON object per line (oldest first)."""
+    try:
+        since_ts = parse_since(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'since' must be an ISO date/datetime or unix seconds")
+
+    async def gen():
+        async for record in ledger.export(since_ts, status):
+            yield json.dumps(record.export(), ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+@app.get("/ask/runs/{run_id}")
+async def get_run(run_id: str):
+    """A run's ledger entry: status, attempts and which stages have a recorded output."""
+    record = await ledger.get(run_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown run")
+    return record.summary()
+
+@app.get("/ask/runs/{run_id}/trace")
+async def get_trace(run_id: str, format: Literal["json", "text"] = "json"):
+    """Waterfall of a traced run: every stage, agent run, model call, tool call and search span with its
+    offset and duration; spans on the critical path are marked. 404 if the run was not sampled."""
+    spans = await tracing.get_spans(run_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="No trace for this run (not sampled, expired or unknown)")
+    view = tracing.waterfall(run_id, spans)
+    if format == "text":
+        return PlainTextResponse(tracing.render_text(view))
+    return view
+
+@app.post("/ask/runs/{run_id}/resume")
+async def resume(run_id: str):
+    """Finish a failed (or interrupted) run: recorded stage outputs are reused, only missing stages run."""
+    try:
+        return await resume_run(run_id)
+    except UnknownRun as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (RunInProgress, RunFinished) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise _workflow_error(e)
+
+def _sse(run_id: str, after: int):
+    """Stream a run's channel as SSE. Event IDs are "<run_id>:<seq>" so a reconnect's
+    Last-Event-ID alone identifies both the run and where to resume."""
+    channel = bus.get(run_id)
+    if channel is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired run")
+
+    async def gen():
+        yield f"retry: 3000\n: run {run_id}\n\n"
+        async for ev in channel.events(after=after, heartbeat=settings.SSE_HEARTBEAT_S):
+            if ev is None:
+                yield ": keep-alive\n\n"
+                continue
+            # Answer text streamed from the Combiner / Formatter gets its own event type
+            kind = ev.stage if ev.stage in ("final", "error") else "delta" if ev.stage.endswith(":delta") else "progress"
+            data = json.dumps({"run_id": run_id, "stage": ev.stage, "ts": ev.ts, "data": ev.data}, ensure_ascii=False, default=str)
+            yield f"id: {run_id}:{ev.id}\nevent: {kind}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Run-Id": run_id},
+    )
+
+def _parse_last_event_id(value: str | None) -> tuple[str, int] | None:
+    if not value or ":" not in value:
+        return None
+    run_id, _, seq = value.rpartition(":")
+    try:
+        return run_id, int(seq)
+    except ValueError:
+        return None
+
+async def _stream(q: str, routing: str | None, profile: str | None, last_event_id: str | None,
+                  idempotency_key: str | None):
+    # A reconnect carries Last-Event-ID: replay that run instead of starting a new one
+    resume = _parse_last_event_id(last_event_id)
+    if resume:
+        return _sse(*resume)
+    q = (q or "").strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="Missing 'question'")
+    profile = _profile(profile)
+    routing = routing or settings.ROUTING_MODE
+    variant = variant_key(routing, profile)
+
+    # A stream for a question that is already running attaches to that run's channel (replayed from the start)
+    async def start() -> str:
+        run_id, _ = start_or_attach(q, variant, lambda: start_workflow(q, routing=routing, profile=profile))
+        return run_id
+
+    if idempotency_key:
+        try:
+            run_id, _ = await idempotent(idempotency_key, q, variant, start)
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    else:
+        run_id = await start()
+    return _sse(run_id, 0)
+
+@app.post("/ask/stream")
+async def ask_stream(req: AskRequest, last_event_id: str | None = Header(default=None),
+                     idempotency_key: str | None = Header(default=None)):
+    """Run the workflow and stream stage events as SSE; the last event is "final" (or "error")."""
+    return await _stream(req.question, req.routing, req.profile, last_event_id, idempotency_key)
+
+@app.get("/ask/stream")
+async def ask_stream_get(question: str = "", routing: Literal["all", "top_k", "threshold"] | None = None,
+                         profile: str | None = None, last_event_id: str | None = Header(default=None),
+                         idempotency_key: str | None = Header(default=None)):
+    """EventSource-friendly variant of POST /ask/stream (browsers reconnect with Last-Event-ID)."""
+    return await _stream(question, routing, profile, last_event_id, idempotency_key)
+
+@app.get("/ask/stream/{run_id}")
+async def ask_stream_attach(run_id: str, after: int = 0, last_event_id: str | None = Header(default=None)):
+    """Attach to an existing run; replays buffered events after `after` (or Last-Event-ID)."""
+    resume = _parse_last_event_id(last_event_id)
+    return _sse(run_id, resume[1] if resume and resume[0] == run_id else after)
+
+@app.post("/ask/jobs", status_code=202)
+async def submit_job(req: JobRequest):
+    """Queue a workflow run and return its job ID immediately; poll GET /ask/jobs/{job_id}."""
+    q = (req.question or "").strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="Missing 'question'")
+    try:
+        job = jobs.submit(q, req.routing or settings.ROUTING_MODE, _profile(req.profile), req.priority)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return {"job_id": job.id, "status": job.status, "poll": f"/ask/jobs/{job.id}"}
+
+@app.get("/ask/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.view()
+
+@app.post("/ask/batch")
+async def ask_batch(req: BatchRequest):
+    """Run many questions; streams one NDJSON line per unique question as it finishes, then a summary line."""
+    questions = [q.strip() for q in req.questions]
+    if not questions or not all(questions):
+        raise HTTPException(status_code=400, detail="'questions' must be a non-empty list of non-empty strings")
+    if len(questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_QUESTIONS} questions per batch")
+    concurrency = min(req.concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    profile = _profile(req.profile)
+
+    async def gen():
+        async for item in run_batch(questions, req.routing or settings.ROUTING_MODE, profile, concurrency):
+            yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
 
+    return StreamingResponse(gen(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
@@ -1,5 +1,8 @@
 # Classifier schema (weights + routing)
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
+
+# Role weight fields, in response order
+WEIGHT_KEYS = ["legal", "marketing", "operations", "strategy", "analyst", "finance"]
 
 class ClassifierSchema(BaseModel):
     legal: float = Field(ge=0)
@@ -11,11 +14,14 @@ class ClassifierSchema(BaseModel):
     top_k: list[str]
     routing_reason: str
     needs_data: list[str]
+    # Where the weights came from: "llm" (Classifier agent), "local" (fast-path router), "reused" (follow-up).
+    # Not part of the model's JSON schema or dumps.
+    _source: str | None = PrivateAttr(default=None)
 
     def normalized(self) -> "ClassifierSchema":
         vals = self.model_dump()
         # Separate weights from other fields
-        weight_keys = ["legal", "marketing", "operations", "strategy", "analyst", "finance"]
+        weight_keys = WEIGHT_KEYS
         weights = {k: vals[k] for k in weight_keys}
         
         s = sum(weights.values())
@@ -43,3 +49,7 @@ class ClassifierSchema(BaseModel):
             needs_data=vals["needs_data"]
         )
 
+
+class BatchClassifierSchema(BaseModel):
+    # One entry per input question, in input order (used by /ask/batch)
+    items: list[ClassifierSchema]
@@ -0,0 +1,8 @@
+# Follow-up relevance schema (which prior stage outputs a refined question invalidates)
+from pydantic import BaseModel
+
+class FollowupSchema(BaseModel):
+    standalone_question: str  # the follow-up rewritten to stand on its own
+    regenerate: list[str]  # roles whose previous answer no longer fits
+    reclassify: bool  # role weights should be recomputed
+    reason: str
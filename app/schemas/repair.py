@@ -0,0 +1,190 @@
+# Local JSON repair and schema coercion for agent outputs (before any corrective re-prompt)
+# What this file contains:
+# - extract_json(): strips code fences / surrounding prose, drops trailing text and closes truncated strings,
+#   brackets and braces
+# - coerce(): walks a schema's fields and fixes what would fail validation: numeric strings, out-of-range
+#   numbers (clamped to Field ge/le; 0–100 read as a percentage where le=1), over-long strings (cut to
+#   max_length), missing or null list fields ([]), lists/numbers where a string is expected
+# - repair(): both, then model_validate; returns (instance, repairs) or raises RepairFailed
+#
+# Each repair is a (field path, kind) pair, e.g. ("next[].due", "type") or ("confidence", "clamped"),
+# so callers can count repairs per field.
+
+import json
+import re
+import types
+from typing import Any, Union, get_args, get_origin
+from annotated_types import Ge, Gt, Le, Lt, MaxLen
+from pydantic import BaseModel, ValidationError
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.S | re.I)
+_NUMBER = re.compile(r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?%?$")
+
+class RepairFailed(ValueError):
+    pass
+
+def extract_json(text: str) -> Any:
+    """Parse model output that should be one JSON object; raises ValueError if nothing usable is found."""
+    text = text.strip()
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("no JSON object in output")
+    text = text[start:]
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    return _close(text)
+
+def _close(text: str) -> Any:
+    """Parse a truncated object: close what was left open, or drop back to the last complete
+    member (the cut may fall inside a key, a number or a literal)."""
+    stack: list[str] = []
+    cuts: list[tuple[int, str]] = []  # (position of a separating comma, closers needed there)
+    in_string = escape = False
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return json.loads(text[: i + 1])  # trailing text after the object
+        elif c == ",":
+            cuts.append((i, "".join(reversed(stack))))
+    head = re.sub(r"[,:\s]*$", "", text + ('"' if in_string else ""))
+    candidates = [head + "".join(reversed(stack))] + [text[:pos] + closers for pos, closers in reversed(cuts[-20:])]
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    raise ValueError("truncated JSON could not be closed")
+
+def _unwrap(annotation) -> Any:
+    """list[X] | None → list[X] (the only optionals in these schemas are `x | None`)."""
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+def _path(prefix: str, name: str) -> str:
+    return f"{prefix}.{name}" if prefix else name
+
+def _number(value: Any, kind: type, meta: list, path: str, repairs: list[tuple[str, str]]) -> Any:
+    if isinstance(value, str) and _NUMBER.match(value.strip()):
+        percent = value.strip().endswith("%")
+        value = float(value.strip().rstrip("%"))
+        if percent:
+            value /= 100
+        repairs.append((path, "numeric_string"))
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return value
+    lo = next((m.ge for m in meta if isinstance(m, Ge)), next((m.gt for m in meta if isinstance(m, Gt)), None))
+    hi = next((m.le for m in meta if isinstance(m, Le)), next((m.lt for m in meta if isinstance(m, Lt)), None))
+    if hi == 1 and 1 < value <= 100:  # a probability given as a percentage
+        value /= 100
+        repairs.append((path, "percent"))
+    if lo is not None and value < lo:
+        value = lo
+        repairs.append((path, "clamped"))
+    elif hi is not None and value > hi:
+        value = hi
+        repairs.append((path, "clamped"))
+    if kind is int and isinstance(value, float):
+        value = int(round(value))
+    return value
+
+def _value(value: Any, annotation, meta: list, path: str, repairs: list[tuple[str, str]]) -> Any:
+    annotation = _unwrap(annotation)
+    origin = get_origin(annotation)
+    if origin is list:
+        (item_type,) = get_args(annotation) or (Any,)
+        if value is None:
+            repairs.append((path, "missing_list"))
+            return []
+        if not isinstance(value, list):
+            repairs.append((path, "type"))
+            value = [value]
+        return [_value(v, item_type, [], f"{path}[]", repairs) for v in value]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _model(value, annotation, path, repairs) if isinstance(value, dict) else value
+    if annotation in (int, float):
+        return _number(value, annotation, meta, path, repairs)
+    if annotation is str:
+        if value is None:
+            repairs.append((path, "type"))
+            value = ""
+        elif isinstance(value, list) and all(isinstance(v, (str, int, float)) for v in value):
+            repairs.append((path, "type"))
+            value = "\n".join(str(v) for v in value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            repairs.append((path, "type"))
+            value = str(value)
+        limit = next((m.max_length for m in meta if isinstance(m, MaxLen)), None)
+        if isinstance(value, str) and limit is not None and len(value) > limit:
+            cut = value[: limit - 1]
+            if " " in cut[limit // 2:]:
+                cut = cut[: cut.rindex(" ")]
+            value = cut.rstrip(" ,;:-") + "…"
+            repairs.append((path, "truncated"))
+        return value
+    if annotation is bool and isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        repairs.append((path, "type"))
+        return value.strip().lower() == "true"
+    return value
+
+def _model(data: dict, schema: type[BaseModel], prefix: str, repairs: list[tuple[str, str]]) -> dict:
+    out = dict(data)
+    for name, info in schema.model_fields.items():
+        path = _path(prefix, name)
+        if name not in out:
+            if get_origin(_unwrap(info.annotation)) is list and info.is_required():
+                out[name] = []
+                repairs.append((path, "missing_list"))
+            continue
+        out[name] = _value(out[name], info.annotation, info.metadata, path, repairs)
+    return out
+
+def coerce(data: dict, schema: type[BaseModel]) -> tuple[dict, list[tuple[str, str]]]:
+    repairs: list[tuple[str, str]] = []
+    return _model(data, schema, "", repairs), repairs
+
+def repair(output: Any, schema: type[BaseModel]) -> tuple[BaseModel, list[tuple[str, str]]]:
+    """Validate `output` (raw text, a dict or a schema instance) into `schema`, fixing what can be fixed locally."""
+    if isinstance(output, schema):
+        return output, []
+    repairs: list[tuple[str, str]] = []
+    if isinstance(output, BaseModel):
+        output = output.model_dump()
+    if not isinstance(output, dict):
+        text = str(output)
+        try:
+            output = json.loads(text)
+        except ValueError:
+            try:
+                output = extract_json(text)
+            except ValueError as e:
+                raise RepairFailed(f"unparseable JSON: {e}") from e
+            repairs.append(("$", "syntax"))
+    if not isinstance(output, dict):
+        raise RepairFailed(f"expected a JSON object, got {type(output).__name__}")
+    data, fixes = coerce(output, schema)
+    try:
+        return schema.model_validate(data), repairs + fixes
+    except ValidationError as e:
+        raise RepairFailed(str(e)) from e
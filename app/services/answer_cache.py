@@ -0,0 +1,195 @@
+# Semantic answer cache in front of run_workflow
+# What this file contains:
+# - normalize_question(): canonical form used for exact matching
+# - AnswerCache: exact match first, then embedding similarity over a NumPy matrix;
+#   TTL + LRU eviction, entry and memory caps (ANSWER_CACHE_TTL_S bounds how stale an answer can get)
+#   Degraded answers (some roles timed out or failed) get ANSWER_CACHE_DEGRADED_TTL_S (default: not cached)
+# - answer_cache: process-wide instance configured from settings
+
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+import numpy as np
+from app.core.config import settings
+from app.services.openai_client import get_client
+from app.utils.metrics import registry
+
+log = logging.getLogger("answer_cache")
+
+HIT, NEAR_HIT, MISS = "hit", "near-hit", "miss"
+
+_WS = re.compile(r"\s+")
+
+def normalize_question(q: str) -> str:
+    return _WS.sub(" ", q).strip().lower().rstrip("?!. ")
+
+@dataclass
+class _Entry:
+    key: tuple[str, str]  # (variant, normalized question)
+    result: dict
+    size: int
+    expires: float
+    row: int | None  # row in the embedding matrix, None if embedding failed
+
+class AnswerCache:
+    def __init__(self, ttl_s: float, max_entries: int, max_bytes: int, threshold: float,
+                 embed_model: str, embed_dim: int, degraded_ttl_s: float = 0):
+        self.ttl_s = ttl_s
+        self.degraded_ttl_s = degraded_ttl_s
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.threshold = threshold
+        self.embed_model = embed_model
+        self.embed_dim = embed_dim
+        self.hits = {HIT: 0, NEAR_HIT: 0, MISS: 0}
+        self._reset()
+
+    def _reset(self):
+        self._entries: OrderedDict[tuple[str, str], _Entry] = OrderedDict()
+        self._bytes = 0
+        # Embedding index: unit rows, so cosine similarity is one mat-vec product
+        self._matrix = np.zeros((0, self.embed_dim), dtype=np.float32)
+        self._expires = np.zeros(0, dtype=np.float64)  # 0 marks a free row
+        self._variant = np.zeros(0, dtype=np.int32)
+        self._row_keys: list[tuple[str, str] | None] = []
+        self._free_rows: list[int] = []
+        self._variant_ids: dict[str, int] = {}
+
+    def clear(self):
+        self._reset()
+
+    def stats(self) -> dict:
+        total = sum(self.hits.values())
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            **self.hits,
+            "hit_ratio": round((self.hits[HIT] + self.hits[NEAR_HIT]) / total, 4) if total else 0.0,
+        }
+
+    async def _embed(self, text: str) -> np.ndarray | None:
+        try:
+            res = await get_client().embeddings.create(model=self.embed_model, input=text, dimensions=self.embed_dim)
+        except Exception as e:
+            log.warning("Embedding failed, exact matching only: %s", e)
+            return None
+        vec = np.asarray(res.data[0].embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else None
+
+    def _drop(self, key: tuple[str, str]):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if entry.row is not None:
+            self._expires[entry.row] = 0
+            self._row_keys[entry.row] = None
+            self._free_rows.append(entry.row)
+
+    def _alloc_row(self) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = len(self._row_keys)
+        if row >= self._matrix.shape[0]:
+            cap = max(64, self._matrix.shape[0] * 2)
+            grow = cap - self._matrix.shape[0]
+            self._matrix = np.vstack([self._matrix, np.zeros((grow, self.embed_dim), dtype=np.float32)])
+            self._expires = np.concatenate([self._expires, np.zeros(grow)])
+            self._variant = np.concatenate([self._variant, np.zeros(grow, dtype=np.int32)])
+        self._row_keys.append(None)
+        return row
+
+    def _nearest(self, variant: str, vec: np.ndarray, now: float) -> tuple[str, str] | None:
+        n = len(self._row_keys)
+        vid = self._variant_ids.get(variant)
+        if n == 0 or vid is None:
+            return None
+        sims = self._matrix[:n] @ vec
+        sims[(self._expires[:n] <= now) | (self._variant[:n] != vid)] = -1.0
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+        return self._row_keys[best]
+
+    def _get(self, key: tuple[str, str], now: float) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= now:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: tuple[str, str], result: dict, vec: np.ndarray | None, ttl_s: float):
+        if key in self._entries:
+            self._drop(key)
+        size = len(json.dumps(result, default=str)) + (self.embed_dim * 4 if vec is not None else 0)
+        if size > self.max_bytes:
+            return
+        row = None
+        if vec is not None:
+            row = self._alloc_row()
+            self._matrix[row] = vec
+            self._expires[row] = time.time() + ttl_s
+            self._variant[row] = self._variant_ids.setdefault(key[0], len(self._variant_ids))
+            self._row_keys[row] = key
+        self._entries[key] = _Entry(key, result, size, time.time() + ttl_s, row)
+        self._bytes += size
+        # LRU eviction down to both caps
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+
+    async def get_or_run(self, question: str, variant: str,
+                         run: Callable[[], Awaitable[dict]]) -> tuple[dict, str]:
+        """Return (result, status) where status is "hit", "near-hit" or "miss"."""
+        key = (variant, normalize_question(question))
+        now = time.time()
+
+        entry = self._get(key, now)
+        if entry is not None:
+            self.hits[HIT] += 1
+            return entry.result, HIT
+
+        vec = await self._embed(key[1])
+        if vec is not None:
+            near = self._nearest(variant, vec, time.time())
+            entry = self._get(near, time.time()) if near else None
+            if entry is not None:
+                self.hits[NEAR_HIT] += 1
+                return entry.result, NEAR_HIT
+
+        self.hits[MISS] += 1
+        result = await run()
+        ttl_s = self.degraded_ttl_s if any((result.get("degraded") or {}).values()) else self.ttl_s
+        if ttl_s > 0:
+            self._put(key, result, vec, ttl_s)
+        return result, MISS
+
+answer_cache = AnswerCache(
+    ttl_s=settings.ANSWER_CACHE_TTL_S,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    max_bytes=settings.ANSWER_CACHE_MAX_BYTES,
+    threshold=settings.ANSWER_CACHE_SIMILARITY,
+    embed_model=settings.ANSWER_CACHE_EMBED_MODEL,
+    embed_dim=settings.ANSWER_CACHE_EMBED_DIM,
+    degraded_ttl_s=settings.ANSWER_CACHE_DEGRADED_TTL_S,
+)
+
+registry.gauge("zylox_answer_cache_hit_ratio", "Answer cache (hit + near-hit) / lookups",
+               fn=lambda: {(): answer_cache.stats()["hit_ratio"]})
+registry.counter("zylox_answer_cache_lookups_total", "Answer cache lookups by result", ("result",),
+                 fn=lambda: {(k,): v for k, v in answer_cache.hits.items()})
+registry.gauge("zylox_answer_cache_entries", "Cached answers", fn=lambda: {(): len(answer_cache._entries)})
+
+def variant_key(routing: str, profile: str) -> str:
+    """Cache variant for a run: answers differ by routing mode and model profile."""
+    return f"routing={routing};profile={profile}"
+
+async def cached_run(question: str, variant: str, run: Callable[[], Awaitable[dict]]) -> tuple[dict, str]:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return await run(), MISS
+    return await answer_cache.get_or_run(question, variant, run)
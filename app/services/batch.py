@@ -0,0 +1,118 @@
+# Batch question runs for /ask/batch
+# What this file contains:
+# - run_batch(): deduplicates normalized questions, runs the workflows under a concurrency limit and yields
+#   one result line per unique question as it finishes
+# - Classifier stages are served several questions per ClassifierBatch call; role stages don't wait for
+#   them (same overlap as a single run), and a failed batch call falls back to per-question classification
+# - Questions the local fast-path router is confident about never reach a classifier call
+# - Each line carries its own timing and either the result or the error; one failure never stops the batch
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import AsyncIterator
+from app.core.config import settings
+from app.schemas.classifier import ClassifierSchema
+from app.agents import profiles
+from app.services.answer_cache import cached_run, normalize_question, variant_key
+from app.agents.roles import classifier_batch_agent
+from app.utils.metrics import registry
+from app.workflow import local_router
+from app.workflow.engine import classify, classify_batch, run_workflow
+
+log = logging.getLogger("batch")
+
+BATCH_ITEMS = registry.counter("zylox_batch_items_total", "Unique /ask/batch questions by outcome", ("status",))
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+async def _classify_chunk(questions: list[str], futures: list[asyncio.Future]):
+    """Resolve each question's future with its weights, or None so that workflow classifies itself."""
+    try:
+        weights = await classify_batch(questions)
+    except Exception as e:
+        log.warning("Batch classification of %d questions failed, falling back per question: %s", len(questions), e)
+        weights = [None] * len(questions)
+    for fut, w in zip(futures, weights):
+        if not fut.done():
+            fut.set_result(w)
+
+async def run_batch(questions: list[str], routing: str, profile: str, concurrency: int) -> AsyncIterator[dict]:
+    """Yield {"indices", "question", "status", "cache", "elapsed_ms", "result"|"error"} per unique
+    question in completion order, then a final {"summary": ...} line."""
+    t0 = time.perf_counter()
+    groups: dict[str, list[int]] = {}
+    unique: list[str] = []
+    for i, q in enumerate(questions):
+        key = normalize_question(q)
+        if key not in groups:
+            groups[key] = []
+            unique.append(q)
+        groups[key].append(i)
+
+    # The batched classifier calls run under the batch's profile
+    ctx = contextvars.copy_context()
+    ctx.run(profiles.current_profile.set, (profile, {}))
+    loop = asyncio.get_running_loop()
+    futures = [loop.create_future() for _ in unique]
+    for q, fut in zip(unique, futures):
+        weights = local_router.predict(q)
+        if weights is not None:
+            fut.set_result(weights)
+    pending = [(q, fut) for q, fut in zip(unique, futures) if not fut.done()]
+    size = max(1, settings.BATCH_CLASSIFY_SIZE)
+    classifiers = [
+        asyncio.create_task(_classify_chunk([q for q, _ in pending[i: i + size]], [f for _, f in pending[i: i + size]]),
+                            context=ctx)
+        for i in range(0, len(pending), size)
+    ] if size > 1 else []
+    if not classifiers:
+        for _, fut in pending:
+            fut.set_result(None)
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+    done: asyncio.Queue[dict] = asyncio.Queue()
+    variant = variant_key(routing, profile)
+
+    async def one(q: str, fut: asyncio.Future):
+        item = {"indices": groups[normalize_question(q)], "question": q}
+
+        async def classifier() -> ClassifierSchema:
+            weights = await asyncio.shield(fut)
+            if weights is None:
+                return await classify(q)
+            if weights._source == "local":
+                return weights
+            profiles.note(classifier_batch_agent)  # list the batch call's model in this run's profile
+            return weights
+
+        async with sem:
+            started = time.perf_counter()
+            item["queued_ms"] = _ms(started - t0)
+            try:
+                result, item["cache"] = await cached_run(
+                    q, variant, lambda: run_workflow(q, routing=routing, classifier=classifier, profile=profile))
+                item.update(status="ok", result=result)
+            except Exception as e:
+                item.update(status="error", error={"type": type(e).__name__, "detail": str(e)[:500]})
+            item["elapsed_ms"] = _ms(time.perf_counter() - started)
+        BATCH_ITEMS.inc(status=item["status"])
+        await done.put(item)
+
+    workers = [asyncio.create_task(one(q, fut)) for q, fut in zip(unique, futures)]
+    counts = {"ok": 0, "error": 0}
+    try:
+        for _ in workers:
+            item = await done.get()
+            counts[item["status"]] += 1
+            yield item
+    finally:
+        # Client went away (or the generator was closed): stop whatever is still running
+        for task in (*classifiers, *workers):
+            task.cancel()
+    yield {"summary": {
+        "questions": len(questions), "unique": len(unique), **counts,
+        "classifier_calls": len(classifiers), "local_routed": len(unique) - len(pending), "elapsed_ms": _ms(time.perf_counter() - t0),
+    }}
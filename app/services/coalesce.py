@@ -0,0 +1,73 @@
+# Request coalescing and idempotency keys for /ask and /ask/stream
+# What this file contains:
+# - coalesced_run(): concurrent requests for the same (normalized question, routing, profile) share one
+#   answer-cache lookup / workflow run and its result
+# - start_or_attach(): the streaming equivalent; a new stream attaches to the matching running run's channel
+# - idempotent(): an Idempotency-Key maps to the first request's (possibly still running) call for
+#   IDEMPOTENCY_TTL_S; retries get that result instead of a new run; a failed call can be retried
+# - IdempotencyConflict: the key was already used for a different request
+
+import asyncio
+from typing import Any, Awaitable, Callable
+from app.core.config import settings
+from app.services.answer_cache import cached_run, normalize_question
+from app.utils.metrics import registry
+from app.utils.progress import bus
+from app.utils.singleflight import SingleFlight
+from app.utils.ttl_cache import TTLCache
+
+_flight = SingleFlight()
+_streams: dict[tuple[str, str], str] = {}  # (variant, normalized question) → run ID of a running stream
+_idempotency = TTLCache(settings.IDEMPOTENCY_TTL_S, settings.IDEMPOTENCY_MAX_KEYS)
+
+COALESCED = registry.counter("zylox_coalesced_requests_total",
+                             "Requests served by another request's run (inflight) or an Idempotency-Key replay (idempotent)",
+                             ("kind",))
+
+class IdempotencyConflict(Exception):
+    pass
+
+def _key(question: str, variant: str) -> tuple[str, str]:
+    return variant, normalize_question(question)
+
+async def coalesced_run(question: str, variant: str, run: Callable[[], Awaitable[dict]]) -> tuple[dict, str, bool]:
+    """cached_run() shared by concurrent identical requests. Returns (result, cache status, joined)."""
+    key = _key(question, variant)
+    joined = key in _flight
+    if joined:
+        COALESCED.inc(kind="inflight")
+    result, status = await _flight.do(key, lambda: cached_run(question, variant, run))
+    return result, status, joined
+
+def start_or_attach(question: str, variant: str, start: Callable[[], str]) -> tuple[str, bool]:
+    """Run ID of the running stream for this question, or of a new one from start(). Returns (run_id, attached)."""
+    for k in [k for k, run_id in _streams.items() if (ch := bus.get(run_id)) is None or ch.closed]:
+        del _streams[k]
+    key = _key(question, variant)
+    run_id = _streams.get(key)
+    if run_id is not None:
+        COALESCED.inc(kind="inflight")
+        return run_id, True
+    run_id = _streams[key] = start()
+    return run_id, False
+
+def _retrieve(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()
+
+async def idempotent(idem_key: str, question: str, variant: str, call: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+    """Run call() once per Idempotency-Key. Returns (value, replayed)."""
+    fingerprint = _key(question, variant)
+    entry = _idempotency.get(idem_key)
+    if entry is not None:
+        used_for, task = entry
+        if used_for != fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+        if not (task.done() and (task.cancelled() or task.exception() is not None)):
+            COALESCED.inc(kind="idempotent")
+            return await asyncio.shield(task), True
+        # The earlier attempt failed: this retry runs again under the same key
+    task = asyncio.ensure_future(call())
+    task.add_done_callback(_retrieve)
+    _idempotency.set(idem_key, (fingerprint, task))
+    return await asyncio.shield(task), False
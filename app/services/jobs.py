@@ -0,0 +1,155 @@
+# Async job queue for /ask/jobs
+# What this file contains:
+# - Job: one queued workflow run (status, timings, result or error, progress snapshot once finished)
+# - JobManager: bounded priority queue drained by a fixed asyncio worker pool; results kept for a TTL
+# - QueueFull: raised when the queue is at capacity (mapped to 503 + Retry-After)
+# - jobs: process-wide instance configured from settings
+
+import asyncio
+import itertools
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from app.core.config import settings
+from app.services.answer_cache import cached_run, variant_key
+from app.utils.metrics import registry
+from app.utils.progress import RunChannel, bus
+from app.workflow.engine import new_run_id, run_workflow
+
+log = logging.getLogger("jobs")
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+@dataclass
+class Job:
+    id: str
+    question: str
+    routing: str
+    profile: str
+    priority: str
+    status: str = "queued"  # queued → running → succeeded | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    cache: str | None = None
+    result: dict | None = None
+    error: str | None = None
+    progress: list[dict] | None = None  # snapshot taken when the job finishes
+
+    def live_progress(self, channel: RunChannel | None = None) -> list[dict]:
+        # Per-stage progress comes from the run's event channel (the job ID is the run ID)
+        channel = channel or bus.get(self.id)
+        return [
+            {"stage": ev.stage, "ts": ev.ts}
+            for ev in (channel.buffer if channel else [])
+            if ev.stage not in ("final", "error")
+        ]
+
+    def view(self) -> dict:
+        # Finished jobs outlive their channel (EVENT_RETENTION_S < JOB_RESULT_TTL_S), so they use the snapshot
+        progress = self.progress if self.progress is not None else self.live_progress()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": progress,
+            "cache": self.cache,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobManager:
+    def __init__(self, workers: int, queue_depth: int, result_ttl_s: float):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.result_ttl_s = result_ttl_s
+        self._jobs: dict[str, Job] = {}
+        self._queue: asyncio.PriorityQueue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._seq = itertools.count()  # FIFO within a priority level
+        self._avg_run_s = 120.0  # EMA of run time, seeds the Retry-After estimate
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue(maxsize=self.queue_depth)
+        self._tasks = [asyncio.create_task(self._worker(i), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        counts: dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "queue_depth": self.queue_depth,
+                "queued": self._queue.qsize() if self._queue else 0, "jobs": counts}
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl_s
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _retry_after(self) -> int:
+        # A queue slot opens when any worker finishes its current run
+        return max(1, math.ceil(self._avg_run_s / max(self.workers, 1)))
+
+    def submit(self, question: str, routing: str, profile: str, priority: str = "interactive") -> Job:
+        self.start()
+        self._prune()
+        if self._queue.full():
+            raise QueueFull(self._retry_after())
+        job = Job(id=new_run_id(), question=question, routing=routing, profile=profile, priority=priority)
+        self._queue.put_nowait((PRIORITIES[priority], next(self._seq), job.id))
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    async def _worker(self, n: int):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            try:
+                if job is not None:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status, job.started_at = "running", time.time()
+        channel = bus.open(job.id)  # held so the snapshot below survives the bus pruning the channel
+        try:
+            job.result, job.cache = await cached_run(
+                job.question, variant_key(job.routing, job.profile),
+                lambda: run_workflow(job.question, routing=job.routing, run_id=job.id, profile=job.profile),
+            )
+            job.status = "succeeded"
+        except Exception as e:
+            log.error("Job %s failed: %s: %s", job.id, type(e).__name__, e)
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at = time.time()
+            job.progress = job.live_progress(channel)
+            bus.close(job.id)  # no-op after a run; a cache hit never opened it in the engine
+            if job.cache in (None, "miss"):  # cache hits say nothing about workflow run time
+                self._avg_run_s = 0.8 * self._avg_run_s + 0.2 * (job.finished_at - job.started_at)
+
+jobs = JobManager(settings.JOB_WORKERS, settings.JOB_QUEUE_DEPTH, settings.JOB_RESULT_TTL_S)
+
+registry.gauge("zylox_jobs", "Jobs by status", ("status",),
+               fn=lambda: {(k,): v for k, v in jobs.stats()["jobs"].items()})
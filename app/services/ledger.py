@@ -0,0 +1,274 @@
+# Run ledger: every stage output of every run, persisted as it completes (SQLite, WAL mode)
+# What this file contains:
+# - Ledger: runs + stage outputs keyed by run ID. Writes go to one background thread in submission
+#   order, so stages never wait on the disk; reads (resume, export) are awaited on the same thread
+# - RunRecord: a run's metadata and its recorded stage outputs (JSON), used by /ask/runs/{id}/resume
+# - Retention: runs older than LEDGER_RETENTION_S, or beyond the newest LEDGER_MAX_RUNS, are pruned
+#   at startup and every LEDGER_PRUNE_EVERY new runs
+# - ledger: process-wide instance configured from settings
+# - CLI: python -m app.services.ledger export [--since 2026-01-01] [--status error] [--out runs.jsonl] | prune
+#
+# Stage outputs are stored as JSON with a kind: "model" (a Pydantic schema's model_dump(); the engine
+# re-validates it on resume) or "json" (dicts, lists and strings as-is). Several uvicorn workers can
+# share the file: WAL lets readers and the single writer per process proceed together.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator
+from pydantic import BaseModel
+from app.core.config import settings
+from app.utils.metrics import registry
+
+log = logging.getLogger("ledger")
+
+LEDGER_WRITES = registry.counter("zylox_ledger_writes_total", "Ledger writes by kind (run/stage/finish) and outcome",
+                                 ("kind", "outcome"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    routing TEXT,
+    profile TEXT,
+    parent TEXT,
+    status TEXT NOT NULL,          -- running | ok | error
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    kind TEXT NOT NULL,            -- model | json
+    output TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (run_id, stage)
+);
+"""
+
+@dataclass
+class RunRecord:
+    run_id: str
+    question: str
+    routing: str | None
+    profile: str | None
+    parent: str | None
+    status: str
+    error: str | None
+    attempts: int
+    created_at: float
+    updated_at: float
+    stages: dict[str, tuple[str, Any]] = field(default_factory=dict)  # stage → (kind, decoded JSON)
+
+    def summary(self) -> dict:
+        return {
+            "run_id": self.run_id, "question": self.question, "routing": self.routing, "profile": self.profile,
+            "parent": self.parent, "status": self.status, "error": self.error, "attempts": self.attempts,
+            "created_at": self.created_at, "updated_at": self.updated_at, "stages": sorted(self.stages),
+        }
+
+    def export(self) -> dict:
+        return {**self.summary(), "stages": {name: output for name, (_, output) in self.stages.items()}}
+
+def _encode(output: Any) -> tuple[str, str]:
+    if isinstance(output, BaseModel):
+        return "model", output.model_dump_json()
+    return "json", json.dumps(output, ensure_ascii=False, default=str)
+
+_RUN_COLUMNS = "run_id, question, routing, profile, parent, status, error, attempts, created_at, updated_at"
+
+class Ledger:
+    def __init__(self, path: str, enabled: bool, retention_s: float, max_runs: int, prune_every: int):
+        self.path = path
+        self.enabled = enabled
+        self.retention_s = retention_s
+        self.max_runs = max_runs
+        self.prune_every = prune_every
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ledger")
+        self._conn: sqlite3.Connection | None = None  # owned by the executor thread
+        self._new_runs = 0
+
+    # --- executor thread -------------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable across app crashes; a power loss may drop the last writes
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _write(self, kind: str, sql: list[tuple[str, tuple]]):
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN")
+                for statement, params in sql:
+                    conn.execute(statement, params)
+            LEDGER_WRITES.inc(kind=kind, outcome="ok")
+        except Exception as e:  # the ledger must never fail a run
+            LEDGER_WRITES.inc(kind=kind, outcome="error")
+            log.warning("Ledger %s write failed: %s", kind, e)
+
+    def _submit(self, kind: str, *sql: tuple[str, tuple]):
+        if self.enabled:
+            self._executor.submit(self._write, kind, list(sql))
+
+    async def _read(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(self._connect(), *args))
+
+    # --- writes (fire-and-forget, applied in order) ---------------------------------------------
+
+    def start_run(self, run_id: str, question: str, routing: str | None, profile: str | None, parent: str | None):
+        """Record a new run, or mark an existing one running again (resume)."""
+        now = time.time()
+        self._submit("run", (
+            "INSERT INTO runs (run_id, question, routing, profile, parent, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 'running', ?, ?) "
+            "ON CONFLICT (run_id) DO UPDATE SET status = 'running', error = NULL, attempts = attempts + 1, updated_at = ?",
+            (run_id, question, routing, profile, parent, now, now, now),
+        ))
+        self._new_runs += 1
+        if self.prune_every and self._new_runs % self.prune_every == 0:
+            self.prune()
+
+    def record(self, run_id: str | None, stage: str, output: Any):
+        if run_id is None or not self.enabled:
+            return
+        try:
+            kind, data = _encode(output)
+        except (TypeError, ValueError) as e:
+            log.warning("Ledger: stage %s of %s is not serialisable: %s", stage, run_id, e)
+            return
+        now = time.time()
+        self._submit(
+            "stage",
+            ("INSERT OR REPLACE INTO stages (run_id, stage, kind, output, finished_at) VALUES (?, ?, ?, ?, ?)",
+             (run_id, stage, kind, data, now)),
+            ("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, run_id)),
+        )
+
+    def finish(self, run_id: str, status: str, error: str | None = None):
+        self._submit("finish", ("UPDATE runs SET status = ?, error = ?, updated_at = ? WHERE run_id = ?",
+                                (status, error, time.time(), run_id)))
+
+    def prune(self):
+        cutoff = time.time() - self.retention_s
+        doomed = "SELECT run_id FROM runs WHERE created_at < ? OR run_id NOT IN " \
+                 "(SELECT run_id FROM runs ORDER BY created_at DESC LIMIT ?)"
+        self._submit(
+            "prune",
+            (f"DELETE FROM stages WHERE run_id IN ({doomed})", (cutoff, self.max_runs)),
+            (f"DELETE FROM runs WHERE run_id IN ({doomed})", (cutoff, self.max_runs)),
+        )
+
+    # --- reads ------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _load(conn: sqlite3.Connection, rows: list[tuple]) -> list[RunRecord]:
+        records = {row[0]: RunRecord(*row) for row in rows}
+        if records:
+            marks = ",".join("?" * len(records))
+            for run_id, stage, kind, output in conn.execute(
+                    f"SELECT run_id, stage, kind, output FROM stages WHERE run_id IN ({marks})", list(records)):
+                records[run_id].stages[stage] = (kind, json.loads(output))
+        return list(records.values())
+
+    @classmethod
+    def _get(cls, conn: sqlite3.Connection, run_id: str) -> RunRecord | None:
+        rows = conn.execute(f"SELECT {_RUN_COLUMNS} FROM runs WHERE run_id = ?", (run_id,)).fetchall()
+        found = cls._load(conn, rows)
+        return found[0] if found else None
+
+    @classmethod
+    def _page(cls, conn: sqlite3.Connection, after: int, since: float | None, status: str | None, limit: int):
+        where, params = ["rowid > ?"], [after]
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        rows = conn.execute(f"SELECT rowid, {_RUN_COLUMNS} FROM runs WHERE {' AND '.join(where)} ORDER BY rowid LIMIT ?",
+                            (*params, limit)).fetchall()
+        return (rows[-1][0] if rows else after), cls._load(conn, [row[1:] for row in rows])
+
+    async def get(self, run_id: str) -> RunRecord | None:
+        if not self.enabled:
+            return None
+        return await self._read(self._get, run_id)
+
+    async def export(self, since: float | None = None, status: str | None = None, page: int = 200) -> AsyncIterator[RunRecord]:
+        """Every retained run (oldest first) with its stage outputs, read page by page."""
+        if not self.enabled:
+            return
+        after = 0
+        while True:
+            after, records = await self._read(self._page, after, since, status, page)
+            if not records:
+                return
+            for record in records:
+                yield record
+
+    async def flush(self):
+        """Wait for every write submitted so far."""
+        await self._read(lambda conn: None)
+
+    async def close(self):
+        if self.enabled:
+            await self._read(lambda conn: conn.close())
+            self._conn = None
+
+ledger = Ledger(settings.LEDGER_PATH, settings.LEDGER_ENABLED, settings.LEDGER_RETENTION_S,
+                settings.LEDGER_MAX_RUNS, settings.LEDGER_PRUNE_EVERY)
+
+def parse_since(value: str) -> float:
+    """Unix seconds or an ISO date/datetime."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+async def _export(args):
+    out = open(args.out, "w") if args.out else sys.stdout
+    n = 0
+    try:
+        async for record in ledger.export(parse_since(args.since) if args.since else None, args.status):
+            out.write(json.dumps(record.export(), ensure_ascii=False) + "\n")
+            n += 1
+    finally:
+        if args.out:
+            out.close()
+    log.info("Exported %d runs", n)
+
+async def _prune():
+    ledger.prune()
+    await ledger.flush()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run ledger maintenance")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    export = sub.add_parser("export", help="write runs and their stage outputs as JSON lines")
+    export.add_argument("--since", help="only runs created at/after this ISO date or unix time")
+    export.add_argument("--status", choices=["running", "ok", "error"])
+    export.add_argument("--out", help="output file (default: stdout)")
+    sub.add_parser("prune", help="apply LEDGER_RETENTION_S / LEDGER_MAX_RUNS now")
+    args = parser.parse_args()
+    asyncio.run(_export(args) if args.cmd == "export" else _prune())
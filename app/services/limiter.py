@@ -0,0 +1,270 @@
+# Process-wide OpenAI concurrency governor
+# What this file contains:
+# - TokenBucket: requests-per-minute / tokens-per-minute limiter
+# - Governor: separate concurrency caps for model calls and vector-store searches + shared RPM/TPM buckets
+# - GovernedTransport: httpx transport wrapping every OpenAI call (Agents SDK, tools, embeddings);
+#   retries 429/5xx with jittered backoff, honouring Retry-After, before giving up
+# - governor: process-wide instance configured from settings
+# - transient() / fatal(): classify a failed call for callers deciding whether to try again or give up
+
+import asyncio
+import email.utils
+import json
+import logging
+import random
+import time
+import httpx
+import openai
+from app.core.config import settings
+from app.utils.metrics import registry
+
+log = logging.getLogger("limiter")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def quota_exhausted(e: BaseException) -> bool:
+    return getattr(e, "code", None) == "insufficient_quota" or "insufficient_quota" in str(e)
+
+def fatal(e: BaseException) -> bool:
+    """An error every other call would hit too (bad key, no permission, no credits): don't retry or degrade."""
+    return isinstance(e, (openai.AuthenticationError, openai.PermissionDeniedError)) or \
+        (isinstance(e, openai.APIStatusError) and quota_exhausted(e))
+
+def transient(e: BaseException) -> bool:
+    """Worth another attempt: timeouts, connection errors, 5xx, and 429s still failing after the governor's retries."""
+    if isinstance(e, (TimeoutError, openai.APITimeoutError, openai.APIConnectionError, httpx.TransportError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code in RETRY_STATUSES and not quota_exhausted(e)
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0  # tokens per second
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()  # FIFO: waiters are served in arrival order
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """Take `amount` tokens, sleeping until they are available. Returns seconds waited."""
+        amount = min(amount, self.capacity)  # one oversized call must not block forever
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                delay = (amount - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= amount
+        return waited
+
+    def level(self) -> float:
+        self._refill()
+        return round(self.tokens, 1)
+
+class _Lane:
+    def __init__(self, concurrency: int):
+        self.limit = concurrency
+        self.sem = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0  # 429s seen from upstream
+        self.gave_up = 0
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "waiting": self.waiting, "calls": self.calls,
+                "retries": self.retries, "throttled_429": self.throttled, "gave_up": self.gave_up}
+
+class Governor:
+    def __init__(self, model_concurrency: int, search_concurrency: int, rpm: int, tpm: int,
+                 max_retries: int, backoff_base_s: float, backoff_max_s: float):
+        self.lanes = {"model": _Lane(model_concurrency), "search": _Lane(search_concurrency)}
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.queued_s = 0.0  # total time calls spent waiting on the buckets/semaphores
+
+    async def acquire(self, lane_name: str, tokens: int):
+        lane = self.lanes[lane_name]
+        t0 = time.monotonic()
+        lane.waiting += 1
+        try:
+            await lane.sem.acquire()
+        finally:
+            lane.waiting -= 1
+        try:
+            await self.rpm.acquire(1)
+            if lane_name == "model":
+                await self.tpm.acquire(tokens)
+        except BaseException:
+            lane.sem.release()
+            raise
+        lane.in_flight += 1
+        lane.calls += 1
+        self.queued_s += time.monotonic() - t0
+
+    def release(self, lane_name: str):
+        lane = self.lanes[lane_name]
+        lane.in_flight -= 1
+        lane.sem.release()
+
+    def backoff(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max_s) + random.uniform(0, 0.25)
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt))
+
+    def stats(self) -> dict:
+        return {
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+            "rpm": {"capacity": self.rpm.capacity, "available": self.rpm.level()},
+            "tpm": {"capacity": self.tpm.capacity, "available": self.tpm.level()},
+            "queued_seconds_total": round(self.queued_s, 3),
+        }
+
+def _lane_for(path: str) -> str | None:
+    if "/vector_stores/" in path and path.endswith("/search"):
+        return "search"
+    if path.endswith(("/responses", "/chat/completions", "/embeddings")):
+        return "model"
+    return None  # files, vector store admin, etc. are not limited
+
+def _estimate_tokens(request: httpx.Request) -> int:
+    # ~4 bytes per token for the prompt, plus whatever output the call may produce
+    body = request.content or b""
+    out = settings.LIMITER_DEFAULT_OUTPUT_TOKENS
+    try:
+        data = json.loads(body) if body else {}
+        out = data.get("max_output_tokens") or data.get("max_completion_tokens") or data.get("max_tokens") or out
+    except ValueError:
+        pass
+    return len(body) // 4 + int(out)
+
+def _retry_after(response: httpx.Response) -> float | None:
+    ms = response.headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Keeps the concurrency slot until the response body is fully read or closed (covers streaming)."""
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release:
+                self._release()
+                self._release = None
+
+class GovernedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, gov: "Governor"):
+        self._inner = inner
+        self._gov = gov
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        lane_name = _lane_for(request.url.path)
+        if lane_name is None:
+            return await self._inner.handle_async_request(request)
+        lane = self._gov.lanes[lane_name]
+        tokens = _estimate_tokens(request) if lane_name == "model" else 0
+
+        attempt = 0
+        while True:
+            await self._gov.acquire(lane_name, tokens)
+            try:
+                response = await self._inner.handle_async_request(request)
+            except httpx.TransportError:
+                self._gov.release(lane_name)
+                if attempt >= self._gov.max_retries:
+                    lane.gave_up += 1
+                    raise
+                lane.retries += 1
+                await asyncio.sleep(self._gov.backoff(attempt, None))
+                attempt += 1
+                continue
+            except BaseException:
+                self._gov.release(lane_name)
+                raise
+
+            if response.status_code in RETRY_STATUSES:
+                try:
+                    body = await response.aread()
+                finally:
+                    await response.aclose()
+                    self._gov.release(lane_name)
+                if response.status_code == 429:
+                    lane.throttled += 1
+                # Quota exhaustion is a billing problem, not back-pressure: retrying will not help
+                if b"insufficient_quota" in body or attempt >= self._gov.max_retries:
+                    if attempt >= self._gov.max_retries:
+                        lane.gave_up += 1
+                    # body is already decoded, so drop the encoding headers that described the raw bytes
+                    headers = [(k, v) for k, v in response.headers.items()
+                               if k.lower() not in ("content-encoding", "content-length")]
+                    return httpx.Response(response.status_code, headers=headers, content=body,
+                                          request=request, extensions=response.extensions)
+                delay = self._gov.backoff(attempt, _retry_after(response))
+                log.info("%s %s -> %d, retry %d in %.1fs", request.method, request.url.path,
+                         response.status_code, attempt + 1, delay)
+                lane.retries += 1
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if response.is_closed:  # body was already buffered by the inner transport
+                self._gov.release(lane_name)
+            else:
+                response.stream = _ReleasingStream(response.stream, lambda: self._gov.release(lane_name))
+            return response
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+governor = Governor(
+    model_concurrency=settings.LIMITER_MODEL_CONCURRENCY,
+    search_concurrency=settings.LIMITER_SEARCH_CONCURRENCY,
+    rpm=settings.LIMITER_RPM,
+    tpm=settings.LIMITER_TPM,
+    max_retries=settings.LIMITER_MAX_RETRIES,
+    backoff_base_s=settings.LIMITER_BACKOFF_BASE_S,
+    backoff_max_s=settings.LIMITER_BACKOFF_MAX_S,
+)
+
+registry.gauge("zylox_openai_in_flight", "OpenAI calls in flight per lane", ("lane",),
+               fn=lambda: {(n,): lane.in_flight for n, lane in governor.lanes.items()})
+registry.gauge("zylox_openai_waiting", "OpenAI calls waiting for a concurrency slot per lane", ("lane",),
+               fn=lambda: {(n,): lane.waiting for n, lane in governor.lanes.items()})
+registry.counter("zylox_openai_retries_total", "OpenAI calls retried by the governor per lane", ("lane",),
+                 fn=lambda: {(n,): lane.retries for n, lane in governor.lanes.items()})
+registry.counter("zylox_openai_throttled_total", "429 responses from OpenAI per lane", ("lane",),
+                 fn=lambda: {(n,): lane.throttled for n, lane in governor.lanes.items()})
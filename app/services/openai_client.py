@@ -1,6 +1,25 @@
-# Shared AsyncOpenAI client (used by function tools)
-from openai import AsyncOpenAI
+# Shared AsyncOpenAI client (used by function tools and, via set_default_openai_client, the Agents SDK)
+# Every request goes through the governor transport in app/services/limiter.py, which owns retries.
+# What this file contains:
+# - get_client(): the process-wide client; created on first use, or by open_client() in the app lifespan
+# - open_client() / close_client(): build the tuned httpx pool (sized to workflow fan-out × concurrency,
+#   keep-alive, HTTP/2 when the h2 package is installed) and close it on shutdown
+# - warm_up(): opens pool connections before the first request (TLS handshakes off the request path)
+
+import asyncio
+import importlib.util
+import logging
+import time
+import httpx
+from agents import set_default_openai_client
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from app.core.config import settings
+from app.services.limiter import GovernedTransport, governor
+
+log = logging.getLogger("openai_client")
+
+# Calls one workflow can have in flight at once: six retrieval searches + six role agents + the classifier
+WORKFLOW_FANOUT = 13
 
 # Only pass org_id and project_id if they're actually set (not comments or empty)
 def is_valid_value(val):
@@ -16,6 +35,62 @@ if is_valid_value(settings.OPENAI_ORG_ID):
     client_kwargs['organization'] = settings.OPENAI_ORG_ID
 if is_valid_value(settings.OPENAI_PROJECT_ID):
     client_kwargs['project'] = settings.OPENAI_PROJECT_ID
+if is_valid_value(settings.OPENAI_BASE_URL):
+    client_kwargs['base_url'] = settings.OPENAI_BASE_URL
+
+def pool_size() -> int:
+    """Connections worth keeping: fan-out × expected workflows, but never more than the governor lets
+    run at once (plus a few for unthrottled calls such as file listing)."""
+    if settings.HTTP_POOL_SIZE:
+        return settings.HTTP_POOL_SIZE
+    governed = settings.LIMITER_MODEL_CONCURRENCY + settings.LIMITER_SEARCH_CONCURRENCY
+    return min(WORKFLOW_FANOUT * settings.HTTP_EXPECTED_CONCURRENCY, governed) + 8
+
+def http2_enabled() -> bool:
+    return settings.HTTP2 and importlib.util.find_spec("h2") is not None
+
+def _build() -> AsyncOpenAI:
+    size = pool_size()
+    transport = httpx.AsyncHTTPTransport(
+        http2=http2_enabled(),
+        limits=httpx.Limits(max_connections=size, max_keepalive_connections=size,
+                            keepalive_expiry=settings.HTTP_KEEPALIVE_S),
+    )
+    http_client = DefaultAsyncHttpxClient(transport=GovernedTransport(transport, governor))
+    # max_retries=0: 429/5xx retries happen once, in the governor, instead of being multiplied by the SDK's own
+    return AsyncOpenAI(**client_kwargs, http_client=http_client, max_retries=0)
+
+_client: AsyncOpenAI | None = None
+
+def get_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = _build()
+        set_default_openai_client(_client)
+    return _client
+
+def open_client() -> AsyncOpenAI:
+    """Fresh client for the app's lifetime (replaces one created lazily before startup)."""
+    global _client
+    _client = None
+    client = get_client()
+    log.info("OpenAI pool: %d connections, http2=%s", pool_size(), http2_enabled())
+    return client
 
-client = AsyncOpenAI(**client_kwargs)
+async def close_client():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.close()
 
+async def warm_up() -> dict:
+    """Open pool connections with cheap requests (GET /models). With HTTP/2 one connection multiplexes,
+    so a couple of requests are enough; otherwise open HTTP_WARMUP_CONNECTIONS in parallel."""
+    client = get_client()
+    n = 2 if http2_enabled() else min(settings.HTTP_WARMUP_CONNECTIONS, pool_size())
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(client.models.list() for _ in range(n)), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        log.warning("Warm-up: %d/%d requests failed (%s)", len(errors), n, errors[0])
+    return {"connections": n, "failed": len(errors), "ms": round((time.perf_counter() - t0) * 1000, 1)}
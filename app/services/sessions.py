@@ -0,0 +1,24 @@
+# Session store for follow-up questions
+# What this file contains:
+# - SessionRun: what a follow-up needs from a finished run (question, weights, role outputs, settings)
+# - sessions: bounded TTL + LRU store keyed by run ID (SESSION_TTL_S / SESSION_MAX_RUNS); every
+#   successful run_workflow is recorded, so any run ID can be followed up while it is retained
+
+from dataclasses import dataclass
+from app.core.config import settings
+from app.utils.metrics import registry
+from app.utils.ttl_cache import TTLCache
+
+@dataclass
+class SessionRun:
+    run_id: str
+    question: str
+    routing: str
+    profile: str
+    weights: dict
+    roles: dict[str, dict]  # role → output, or a {"status": ...} entry if it did not answer
+    parent: str | None = None  # run ID this one followed up
+
+sessions = TTLCache(settings.SESSION_TTL_S, settings.SESSION_MAX_RUNS)
+
+registry.gauge("zylox_sessions", "Runs retained for follow-up questions", fn=lambda: {(): len(sessions)})
@@ -0,0 +1,230 @@
+# Local memory-mapped mirror of the role vector stores
+# What this file contains:
+# - sync_store(): copies a hosted vector store's files into a local index (chunks + our own embeddings,
+#   since the hosted API does not expose its vectors) and atomically swaps it in
+# - MirrorIndex: float32 embedding matrix via np.memmap + compact text side files; batched dot-product top-k
+# - search_mirror(): used by retrieval._fetch; returns None when the mirror is missing or stale (→ hosted search).
+#   Index loading, the matrix scan and the text reads run in a worker thread, never on the event loop
+# - CLI: python -m app.tools.mirror sync [--role legal ...]
+#
+# On-disk layout per store (read-only once written; uvicorn workers share the pages, no copies):
+#   {MIRROR_DIR}/{store_id}/current -> v{timestamp}/
+#     meta.json        {"store_id", "count", "dim", "embed_model", "synced_at", "docs": [titles]}
+#     embeddings.f32   (count, dim) float32, unit rows
+#     offsets.i64      (count + 1,) byte offsets into texts.bin
+#     doc_ids.i32      (count,) index into meta["docs"]
+#     texts.bin        UTF-8 chunk texts, concatenated
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from app.core.config import settings
+from app.services.openai_client import get_client
+from app.utils.ttl_cache import TTLCache
+
+log = logging.getLogger("mirror")
+
+_EMBED_BATCH = 128
+
+class MirrorIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        n, d = self.meta["count"], self.meta["dim"]
+        self.embeddings = np.memmap(os.path.join(path, "embeddings.f32"), dtype=np.float32, mode="r", shape=(n, d))
+        self.offsets = np.memmap(os.path.join(path, "offsets.i64"), dtype=np.int64, mode="r", shape=(n + 1,))
+        self.doc_ids = np.memmap(os.path.join(path, "doc_ids.i32"), dtype=np.int32, mode="r", shape=(n,))
+        size = os.path.getsize(os.path.join(path, "texts.bin"))
+        self.texts = np.memmap(os.path.join(path, "texts.bin"), dtype=np.uint8, mode="r", shape=(size,)) if size else None
+
+    @property
+    def synced_at(self) -> float:
+        return self.meta["synced_at"]
+
+    def text(self, row: int) -> str:
+        if self.texts is None:
+            return ""
+        return bytes(self.texts[self.offsets[row]: self.offsets[row + 1]]).decode("utf-8", "replace")
+
+    def title(self, row: int) -> str:
+        return self.meta["docs"][int(self.doc_ids[row])]
+
+    def search(self, queries: np.ndarray, k: int, block: int) -> list[list[tuple[int, float]]]:
+        """Top-k (row, score) per query row. Scans the matrix in row blocks so only one block
+        of scores per query is materialised, however large the store."""
+        queries = np.atleast_2d(queries).astype(np.float32)
+        n = self.embeddings.shape[0]
+        k = min(k, n)
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, n, block):
+            scores = queries @ self.embeddings[start: start + block].T  # (q, block)
+            kk = min(k, scores.shape[1])
+            idx = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            best_rows = np.concatenate([best_rows, idx + start], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, idx, axis=1)], axis=1)
+            if best_rows.shape[1] > k:  # keep the running top-k only
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return [
+            [(int(best_rows[q, j]), float(best_scores[q, j])) for j in order[q]]
+            for q in range(len(queries))
+        ]
+
+def _store_dir(store_id: str) -> str:
+    return os.path.join(settings.MIRROR_DIR, store_id)
+
+# Loaded indexes, refreshed when a sync swaps the `current` link
+_indexes: dict[str, tuple[str, MirrorIndex]] = {}
+_checked: dict[str, float] = {}
+_query_vectors = TTLCache(ttl_s=3600, max_entries=4096)
+_load_lock = threading.Lock()  # get_index runs in worker threads
+
+def get_index(store_id: str) -> MirrorIndex | None:
+    """The store's current mirror, or None if it is missing or older than MIRROR_MAX_AGE_S.
+    Blocking (file reads): call it from a worker thread."""
+    with _load_lock:
+        return _get_index(store_id)
+
+def _get_index(store_id: str) -> MirrorIndex | None:
+    now = time.time()
+    if now - _checked.get(store_id, 0) > 30 or store_id not in _indexes:
+        _checked[store_id] = now
+        link = os.path.join(_store_dir(store_id), "current")
+        try:
+            target = os.path.realpath(link, strict=True)
+        except OSError:
+            _indexes.pop(store_id, None)
+            return None
+        if _indexes.get(store_id, ("",))[0] != target:
+            try:
+                _indexes[store_id] = (target, MirrorIndex(target))
+            except (OSError, ValueError, KeyError) as e:
+                log.warning("Mirror for %s unreadable, using hosted search: %s", store_id, e)
+                _indexes.pop(store_id, None)
+                return None
+    entry = _indexes.get(store_id)
+    if entry is None or now - entry[1].synced_at > settings.MIRROR_MAX_AGE_S:
+        return None
+    return entry[1]
+
+async def _embed(texts: list[str], model: str) -> np.ndarray:
+    res = await get_client().embeddings.create(model=model, input=texts)
+    vecs = np.asarray([d.embedding for d in sorted(res.data, key=lambda d: d.index)], dtype=np.float32)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs / np.where(norms == 0, 1, norms)
+
+async def search_mirror(store_id: str, query: str, k: int) -> list[tuple[str, str, float]] | None:
+    """(title, text, score) hits from the local mirror, or None to fall back to the hosted store."""
+    index = await asyncio.to_thread(get_index, store_id)
+    if index is None:
+        return None
+    model = index.meta["embed_model"]
+    vec = _query_vectors.get((model, query))
+    if vec is None:
+        vec = (await _embed([query], model))[0]
+        _query_vectors.set((model, query), vec)
+    return await asyncio.to_thread(_lookup, index, vec, k)
+
+def _lookup(index: MirrorIndex, vec: np.ndarray, k: int) -> list[tuple[str, str, float]]:
+    hits = index.search(vec, k, settings.MIRROR_SEARCH_BLOCK_ROWS)[0]
+    return [(index.title(row), index.text(row), score) for row, score in hits]
+
+def _chunk(text: str, size: int, overlap: int) -> list[str]:
+    text = text.strip()
+    if len(text) <= size:
+        return [text] if text else []
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            # Prefer to break at a paragraph or sentence boundary inside the window
+            cut = max(text.rfind("\n\n", start, end), text.rfind(". ", start, end))
+            if cut > start + size // 2:
+                end = cut + 1
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        space = text.find(" ", start, end)  # don't open the next chunk mid-word
+        if space != -1:
+            start = space + 1
+    return [c for c in chunks if c]
+
+async def sync_store(store_id: str) -> str:
+    """Mirror one hosted vector store; returns the new version directory."""
+    model = settings.MIRROR_EMBED_MODEL
+    docs: list[str] = []
+    chunks: list[tuple[int, str]] = []
+    async for vs_file in get_client().vector_stores.files.list(vector_store_id=store_id, filter="completed"):
+        try:
+            title = (await get_client().files.retrieve(vs_file.id)).filename
+        except Exception:
+            title = vs_file.id
+        parts = [p.text or "" async for p in get_client().vector_stores.files.content(vs_file.id, vector_store_id=store_id)]
+        doc_id = len(docs)
+        docs.append(title)
+        chunks += [(doc_id, c) for c in _chunk("\n".join(parts), settings.MIRROR_CHUNK_CHARS, settings.MIRROR_CHUNK_OVERLAP)]
+
+    vectors = [await _embed([c for _, c in chunks[i: i + _EMBED_BATCH]], model) for i in range(0, len(chunks), _EMBED_BATCH)]
+    dim = vectors[0].shape[1] if vectors else 0
+
+    base = _store_dir(store_id)
+    version = os.path.join(base, f"v{int(time.time() * 1000)}")
+    os.makedirs(version)
+    matrix = np.memmap(os.path.join(version, "embeddings.f32"), dtype=np.float32, mode="w+", shape=(len(chunks), dim)) if chunks else None
+    row = 0
+    for block in vectors:
+        matrix[row: row + len(block)] = block
+        row += len(block)
+    if matrix is not None:
+        matrix.flush()
+    else:
+        open(os.path.join(version, "embeddings.f32"), "wb").close()
+
+    encoded = [c.encode("utf-8") for _, c in chunks]
+    np.concatenate([[0], np.cumsum([len(b) for b in encoded], dtype=np.int64)]).astype(np.int64).tofile(os.path.join(version, "offsets.i64"))
+    np.asarray([d for d, _ in chunks], dtype=np.int32).tofile(os.path.join(version, "doc_ids.i32"))
+    with open(os.path.join(version, "texts.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    with open(os.path.join(version, "meta.json"), "w") as f:
+        json.dump({"store_id": store_id, "count": len(chunks), "dim": dim, "embed_model": model,
+                   "synced_at": time.time(), "docs": docs}, f)
+
+    # Atomic swap: readers follow `current`; old versions stay valid for processes that still map them
+    tmp_link = os.path.join(base, "current.tmp")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.basename(version), tmp_link)
+    os.replace(tmp_link, os.path.join(base, "current"))
+    for old in sorted(d for d in os.listdir(base) if d.startswith("v"))[:-settings.MIRROR_KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(base, old), ignore_errors=True)
+    log.info("Mirrored %s: %d files, %d chunks → %s", store_id, len(docs), len(chunks), version)
+    return version
+
+async def _sync_roles(roles: list[str]):
+    from app.tools.retrieval import ROLE_RETRIEVAL
+    for role in roles:
+        store_setting, _ = ROLE_RETRIEVAL[role]
+        await sync_store(getattr(settings, store_setting))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Mirror role vector stores into local memory-mapped indexes")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sync = sub.add_parser("sync")
+    sync.add_argument("--role", action="append", help="role(s) to sync (default: all)")
+    args = parser.parse_args()
+    from app.tools.retrieval import ROLE_RETRIEVAL
+    asyncio.run(_sync_roles(args.role or list(ROLE_RETRIEVAL)))
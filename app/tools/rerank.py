@@ -0,0 +1,105 @@
+# Post-retrieval stage: deduplicate, rerank and budget the candidate passages of one search
+# What this file contains:
+# - Passage: (title, text, store score)
+# - dedup(): drops near-identical / mostly-contained chunks (overlapping chunks of one document) by
+#   comparing sets of hashed word 5-shingles
+# - bm25_scores(): Okapi BM25 of each passage against the question, statistics taken from the candidates
+# - select(): dedup → rank by BM25 blended with the store's own score → keep the best passages within a
+#   character budget; returns "[title] text" lines in rank order plus counts for metrics
+
+import math
+import re
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how if in into is it its of on or our should so that the their "
+    "then there these this to was we what when which who will with would you your".split()
+)
+_SHINGLE = 5
+_K1, _B = 1.2, 0.75
+_MIN_CLIP_CHARS = 300  # a passage cut to fit the budget must keep at least this much
+
+@dataclass
+class Passage:
+    title: str
+    text: str
+    score: float | None = None  # the store's relevance score, if it returned one
+
+def tokens(text: str) -> list[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+def _shingles(text: str) -> set[int]:
+    words = _WORD.findall(text.lower())
+    if len(words) < _SHINGLE:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {zlib.crc32(" ".join(words[i: i + _SHINGLE]).encode()) for i in range(len(words) - _SHINGLE + 1)}
+
+def dedup(passages: list[Passage], threshold: float) -> tuple[list[Passage], int]:
+    """Keep the first of any passages whose shingle overlap (relative to the smaller one) is ≥ threshold.
+    Input order is the preference order. Returns (kept, dropped count)."""
+    kept: list[Passage] = []
+    seen: list[set[int]] = []
+    for p in passages:
+        sh = _shingles(p.text)
+        if not sh:
+            continue
+        if any(len(sh & other) >= threshold * min(len(sh), len(other)) for other in seen):
+            continue
+        kept.append(p)
+        seen.append(sh)
+    return kept, len(passages) - len(kept)
+
+def bm25_scores(query: str, passages: list[Passage]) -> list[float]:
+    docs = [Counter(tokens(f"{p.title} {p.text}")) for p in passages]
+    if not docs:
+        return []
+    n = len(docs)
+    avg_len = sum(sum(d.values()) for d in docs) / n or 1
+    df = Counter(term for d in docs for term in d)
+    terms = set(tokens(query))
+    scores = []
+    for d in docs:
+        length = sum(d.values())
+        s = 0.0
+        for t in terms:
+            tf = d.get(t, 0)
+            if tf:
+                idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                s += idf * tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * length / avg_len))
+        scores.append(s)
+    return scores
+
+def _unit(values: list[float]) -> list[float]:
+    hi, lo = max(values), min(values)
+    return [(v - lo) / (hi - lo) if hi > lo else 1.0 for v in values]
+
+def select(question: str, passages: list[Passage], budget_chars: int, dedup_threshold: float,
+           bm25_weight: float) -> tuple[list[str], dict]:
+    """"[title] text" lines of the best passages that fit in budget_chars, best first."""
+    unique, duplicates = dedup(passages, dedup_threshold)
+    if not unique:
+        return [], {"candidates": len(passages), "duplicates": duplicates, "kept": 0, "chars": 0}
+    lexical = _unit(bm25_scores(question, unique))
+    if all(p.score is not None for p in unique):
+        store = _unit([p.score for p in unique])
+    else:  # no scores: the store's order is the only signal
+        store = _unit([-float(i) for i in range(len(unique))])
+    ranked = sorted(range(len(unique)), key=lambda i: bm25_weight * lexical[i] + (1 - bm25_weight) * store[i], reverse=True)
+
+    lines: list[str] = []
+    used = 0
+    for i in ranked:
+        p = unique[i]
+        line = f"[{p.title}] {' '.join(p.text.split())}"
+        room = budget_chars - used - (1 if lines else 0)
+        if len(line) > room:
+            if room < _MIN_CLIP_CHARS:
+                continue
+            cut = line[: room - 1]
+            line = (cut[: cut.rindex(" ")] if cut.rfind(" ") > len(p.title) + 3 else cut) + "…"
+        lines.append(line)
+        used += len(line) + (1 if len(lines) > 1 else 0)
+    return lines, {"candidates": len(passages), "duplicates": duplicates, "kept": len(lines), "chars": used}
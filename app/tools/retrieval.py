@@ -1,52 +1,153 @@
 # Function tools for role-private retrieval using Vector Stores (Agents SDK tool calling)
 # What this file contains:
-# - One Python function per role, decorated as an Agents SDK function tool.
-# - Each calls OpenAI Vector Stores search and returns a text blob (title + snippet lines).
+# - One async Python function per role, decorated as an Agents SDK function tool.
+# - retrieve_for_role(): the same per-role search, used directly by the engine's prefetch stage.
+# - Each calls OpenAI Vector Stores search and returns a text blob ("[title] passage" lines).
+# - Searches fetch RETRIEVAL_CANDIDATES passages; app/tools/rerank.py drops near-duplicates, reranks them with
+#   BM25 against the question and keeps the best within the role's character budget.
+# - Candidate lists go through a per-store TTL cache with single-flight coalescing; errors are never cached.
+# - RETRIEVAL_BACKEND="mirror" serves searches from the local mmap index (app/tools/mirror.py) when one is
+#   fresh, falling back to hosted search otherwise.
+# - Each search is a "search" span (candidates, duplicates, kept, chars) in traced runs (app/utils/tracing.py).
 
+import time
 from typing import Annotated
 from agents import function_tool
-from app.services.openai_client import client
+from app.services.openai_client import get_client
+from app.tools.mirror import search_mirror
+from app.tools.rerank import Passage, select
 from app.core.config import settings
+from app.utils import tracing
+from app.utils.metrics import SEARCH_ERRORS, SEARCH_RESULTS, SEARCH_SECONDS, registry
+from app.utils.singleflight import SingleFlight
+from app.utils.ttl_cache import TTLCache
 
-async def _search(store_id: str, query: str, k: int = 6) -> str:
-    try:
-        res = await client.vector_stores.search(vector_store_id=store_id, query=query, max_num_results=k)
-        lines = []
-        for r in res:
-            title = getattr(r, "filename", None) or getattr(r, "document_id", None) or "doc"
-            snippet = getattr(r, "snippet", None) or getattr(r, "text", None) or ""
-            lines.append(f"[{title}] {snippet}".strip())
-        return "\n".join(lines) if lines else "(no role-private context found)"
-    except Exception as e:
-        return f"(search error: {e})"
+_caches: dict[str, TTLCache] = {}
+_flight = SingleFlight()
+
+def _cache_for(store_id: str) -> TTLCache:
+    cache = _caches.get(store_id)
+    if cache is None:
+        cache = _caches[store_id] = TTLCache(settings.RETRIEVAL_CACHE_TTL_S, settings.RETRIEVAL_CACHE_MAX_ENTRIES)
+    return cache
+
+def retrieval_cache_stats() -> dict:
+    return {
+        "stores": {store_id: cache.stats() for store_id, cache in _caches.items()},
+        "upstream_calls": _flight.calls,
+        "coalesced": _flight.shared,
+        "in_flight": len(_flight),
+    }
+
+registry.gauge(
+    "zylox_retrieval_cache_hit_ratio", "Vector store search cache hit ratio per store", ("store",),
+    fn=lambda: {(store_id,): cache.stats()["hit_ratio"] for store_id, cache in _caches.items()},
+)
+registry.counter(
+    "zylox_retrieval_cache_lookups_total", "Vector store search cache lookups per store", ("store", "result"),
+    fn=lambda: {
+        (store_id, result): getattr(cache, attr)
+        for store_id, cache in _caches.items()
+        for result, attr in (("hit", "hits"), ("miss", "misses"))
+    },
+)
+
+_BACKEND_USED = registry.counter("zylox_retrieval_backend_total", "Searches served per store by backend (hosted/mirror)", ("store", "backend"))
+
+_PASSAGES = registry.counter("zylox_retrieval_passages_total", "Candidate passages per store by outcome (kept/duplicate/dropped)",
+                             ("store", "outcome"))
+_CONTEXT_CHARS = registry.histogram("zylox_retrieval_context_chars", "Characters of role context after reranking", ("store",),
+                                    (500, 1000, 2000, 4000, 8000, 16000))
+
+def _result_text(r) -> str:
+    # Search results carry their chunk as content=[{"type": "text", "text": ...}]
+    parts = [getattr(c, "text", None) or "" for c in (getattr(r, "content", None) or []) if getattr(c, "type", "text") == "text"]
+    return "\n".join(p for p in parts if p).strip()
+
+async def _fetch(store_id: str, query: str, k: int) -> list[Passage]:
+    t0 = time.perf_counter()
+    hits = await search_mirror(store_id, query, k) if settings.RETRIEVAL_BACKEND == "mirror" else None
+    if hits is not None:
+        _BACKEND_USED.inc(store=store_id, backend="mirror")
+        passages = [Passage(title, text, score) for title, text, score in hits]
+    else:
+        _BACKEND_USED.inc(store=store_id, backend="hosted")
+        res = await get_client().vector_stores.search(vector_store_id=store_id, query=query, max_num_results=k)
+        passages = [
+            Passage(getattr(r, "filename", None) or getattr(r, "file_id", None) or "doc", _result_text(r), getattr(r, "score", None))
+            for r in res.data
+        ]
+    SEARCH_SECONDS.observe(time.perf_counter() - t0, store=store_id)
+    SEARCH_RESULTS.observe(len(passages), store=store_id)
+    return passages
+
+async def _candidates(store_id: str, query: str, k: int) -> list[Passage]:
+    cache = _cache_for(store_id)
+    passages = cache.get((query, k))
+    if passages is None:
+        # Concurrent identical searches share one upstream call
+        passages = await _flight.do((store_id, query, k), lambda: _fetch(store_id, query, k))
+        cache.set((query, k), passages)
+    return passages
+
+async def _search(store_id: str, query: str, question: str, budget_chars: int) -> str:
+    with tracing.span("search", store=store_id, budget_chars=budget_chars) as span:
+        try:
+            passages = await _candidates(store_id, query, settings.RETRIEVAL_CANDIDATES)
+        except Exception as e:
+            SEARCH_ERRORS.inc(store=store_id)
+            span.span_data.data["error"] = str(e)[:300]
+            return f"(search error: {e})"
+        lines, stats = select(question, passages, budget_chars, settings.RETRIEVAL_DEDUP_THRESHOLD, settings.RETRIEVAL_BM25_WEIGHT)
+        span.span_data.data.update(stats)
+    _PASSAGES.inc(stats["kept"], store=store_id, outcome="kept")
+    _PASSAGES.inc(stats["duplicates"], store=store_id, outcome="duplicate")
+    _PASSAGES.inc(stats["candidates"] - stats["duplicates"] - stats["kept"], store=store_id, outcome="dropped")
+    _CONTEXT_CHARS.observe(stats["chars"], store=store_id)
+    return "\n".join(lines) if lines else "(no role-private context found)"
+
+# Role → (settings field of its private store, search query template)
+ROLE_RETRIEVAL = {
+    "legal": ("VECTOR_STORE_LEGAL", 'Question: "{question}"\nRetrieve legal/compliance clauses and checklists; include titles/IDs.'),
+    "marketing": ("VECTOR_STORE_MARKETING", 'Question: "{question}"\nRetrieve messaging frameworks and disclosure rules; include titles/IDs.'),
+    "operations": ("VECTOR_STORE_OPS", 'Question: "{question}"\nRetrieve SOPs/runbooks/checklists; include titles/IDs.'),
+    "strategy": ("VECTOR_STORE_STRATEGY", 'Question: "{question}"\nRetrieve strategy memos/competitive notes; include titles/IDs.'),
+    "analyst": ("VECTOR_STORE_ANALYST", 'Question: "{question}"\nRetrieve KPIs/benchmarks/forecasts; include titles/IDs.'),
+    "finance": ("VECTOR_STORE_FINANCE", 'Question: "{question}"\nRetrieve budgets/unit economics/ROI; include titles/IDs.'),
+}
+
+async def retrieve_for_role(role: str, question: str) -> str:
+    """Search a role's private store for the question (used by the tools and the prefetch stage)."""
+    store_setting, template = ROLE_RETRIEVAL[role]
+    budget = settings.RETRIEVAL_ROLE_BUDGET_CHARS.get(role, settings.RETRIEVAL_BUDGET_CHARS)
+    return await _search(getattr(settings, store_setting), template.format(question=question), question, budget)
 
 @function_tool
-def legal_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Legal private context text blob"]:
+async def legal_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Legal private context text blob"]:
     """Retrieve legal/compliance passages for the question (privacy/AI/state laws, sectoral rules, IP/licensing, TCPA/CAN-SPAM, accessibility, export/sanctions). Returns a newline-joined blob with [title] snippet."""
-    return _search.__wrapped__(settings.VECTOR_STORE_LEGAL, f'Question: "{question}"\nRetrieve legal/compliance clauses and checklists; include titles/IDs.')  # type: ignore
+    return await retrieve_for_role("legal", question)
 
 @function_tool
-def marketing_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Marketing private context text blob"]:
+async def marketing_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Marketing private context text blob"]:
     """Retrieve messaging frameworks, disclosure/endorsement rules, brand voice guides for the question."""
-    return _search.__wrapped__(settings.VECTOR_STORE_MARKETING, f'Question: "{question}"\nRetrieve messaging frameworks and disclosure rules; include titles/IDs.')  # type: ignore
+    return await retrieve_for_role("marketing", question)
 
 @function_tool
-def ops_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Ops private context text blob"]:
+async def ops_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Ops private context text blob"]:
     """Retrieve SOPs, runbooks, risk registers, governance procedures, rollout checklists for the question."""
-    return _search.__wrapped__(settings.VECTOR_STORE_OPS, f'Question: "{question}"\nRetrieve SOPs/runbooks/checklists; include titles/IDs.')  # type: ignore
+    return await retrieve_for_role("operations", question)
 
 @function_tool
-def strategy_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Strategy private context text blob"]:
+async def strategy_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Strategy private context text blob"]:
     """Retrieve strategy memos, competitive notes, prioritization, pricing/segmentation for the question."""
-    return _search.__wrapped__(settings.VECTOR_STORE_STRATEGY, f'Question: "{question}"\nRetrieve strategy memos/competitive notes; include titles/IDs.')  # type: ignore
+    return await retrieve_for_role("strategy", question)
 
 @function_tool
-def analyst_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Analyst private context text blob"]:
+async def analyst_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Analyst private context text blob"]:
     """Retrieve KPI definitions, benchmarks, forecast sheets, experiment results, market sizing for the question."""
-    return _search.__wrapped__(settings.VECTOR_STORE_ANALYST, f'Question: "{question}"\nRetrieve KPIs/benchmarks/forecasts; include titles/IDs.')  # type: ignore
+    return await retrieve_for_role("analyst", question)
 
 @function_tool
-def finance_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Finance private context text blob"]:
+async def finance_retrieval(question: Annotated[str, "User question string"]) -> Annotated[str, "Finance private context text blob"]:
     """Retrieve budgets, pro formas, unit economics, tooling costs, ROI analyses for the question."""
-    return _search.__wrapped__(settings.VECTOR_STORE_FINANCE, f'Question: "{question}"\nRetrieve budgets/unit economics/ROI; include titles/IDs.')  # type: ignore
-
+    return await retrieve_for_role("finance", question)
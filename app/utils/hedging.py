@@ -0,0 +1,54 @@
+# Hedged calls with soft/hard deadlines
+# What this file contains:
+# - hedged(): runs a call; past the soft deadline (or on an early retryable failure) starts one duplicate
+#   and takes whichever succeeds first; past the hard deadline cancels both and raises TimeoutError.
+#   A failure that `retryable` rejects is raised at once (no duplicate of a call that cannot succeed)
+# - HedgeResult: the value plus which attempt produced it (for metrics and the response)
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+@dataclass
+class HedgeResult:
+    value: Any
+    hedged: bool  # a duplicate was started
+    winner: str  # "primary" | "hedge"
+
+async def hedged(make: Callable[[], Awaitable[Any]], soft_s: float | None, hard_s: float | None,
+                 on_hedge: Callable[[str], Awaitable[None]] | None = None,
+                 retryable: Callable[[BaseException], bool] | None = None) -> HedgeResult:
+    """`make` is called once per attempt. soft_s=None disables hedging, hard_s=None disables the deadline.
+    Raises TimeoutError at the hard deadline, the first non-retryable error, or the last error if every
+    attempt failed."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + hard_s if hard_s is not None else None
+    attempts = {asyncio.create_task(make()): "primary"}
+    hedge_at = loop.time() + soft_s if soft_s is not None else None
+    error: BaseException | None = None
+    try:
+        while attempts:
+            now = loop.time()
+            waits = [t - now for t in (deadline, hedge_at) if t is not None]
+            done, _ = await asyncio.wait(attempts, timeout=max(0.0, min(waits)) if waits else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                label = attempts.pop(task)
+                if task.exception() is None:
+                    return HedgeResult(task.result(), hedged=hedge_at is None and soft_s is not None, winner=label)
+                error = task.exception()
+                if retryable is not None and not retryable(error):
+                    raise error
+            if deadline is not None and loop.time() >= deadline:
+                raise TimeoutError(f"hard deadline of {hard_s:g}s exceeded")
+            # Hedge once: when the soft deadline passes, or right away if the primary already failed
+            if hedge_at is not None and (loop.time() >= hedge_at or not attempts):
+                hedge_at = None
+                reason = "soft_deadline" if attempts else "failed"
+                if on_hedge:
+                    await on_hedge(reason)
+                attempts[asyncio.create_task(make())] = "hedge"
+        raise error
+    finally:
+        for task in attempts:
+            task.cancel()
@@ -0,0 +1,160 @@
+# In-process metrics with Prometheus text exposition
+# What this file contains:
+# - Counter / Gauge / Histogram: labelled metric families; updates are plain dict operations (no locks,
+#   single event loop), so recording on the request path costs well under a microsecond
+# - Registry.render(): Prometheus text format 0.0.4 for GET /metrics
+# - Callback gauges, sampled at scrape time (cache hit ratios, limiter state, queue depth)
+# - The workflow's metric families, shared by the engine, the retrieval tools and main.py
+
+import bisect
+import math
+from typing import Callable
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180, 300, 600)
+SEARCH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 4, 6, 8, 12, 20, 50)
+
+def _fmt_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_value(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 fn: Callable[[], dict[tuple[str, ...], float]] | None = None):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._fn = fn  # optional: read a counter some other component already keeps
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list[str]:
+        values = self._fn() if self._fn else self._values
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}" for k, v in values.items()]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 fn: Callable[[], dict[tuple[str, ...], float]] | None = None):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._fn = fn  # optional: sampled at scrape time instead of set()/inc()
+
+    def set(self, value: float, **labels: str):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def collect(self) -> list[str]:
+        values = self._fn() if self._fn else self._values
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}" for k, v in values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def collect(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, c in zip((*self.buckets, math.inf), counts):
+                cumulative += c
+                le = 'le="' + _fmt_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_value(total[0])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = (), fn=None) -> Counter:
+        return self.register(Counter(name, help, labels, fn))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = (), fn=None) -> Gauge:
+        return self.register(Gauge(name, help, labels, fn))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        out: list[str] = []
+        for m in self._metrics.values():
+            out += m.header()
+            out += m.collect()
+        return "\n".join(out) + "\n"
+
+registry = Registry()
+
+# Workflow
+WORKFLOWS_IN_FLIGHT = registry.gauge("zylox_workflows_in_flight", "Workflows currently running")
+WORKFLOWS = registry.counter("zylox_workflows_total", "Finished workflows by outcome", ("status",))
+WORKFLOW_SECONDS = registry.histogram("zylox_workflow_duration_seconds", "End-to-end run_workflow latency")
+STAGE_SECONDS = registry.histogram("zylox_stage_duration_seconds", "Per-stage latency (roles are stages named after the role)", ("stage",))
+ROLE_OUTCOMES = registry.counter("zylox_role_outcomes_total", "Role stage outcomes (ok/hedge_won/timed_out/failed)", ("role", "outcome"))
+HEDGES = registry.counter("zylox_hedges_total", "Hedged duplicate calls started per role, by trigger", ("role", "reason"))
+
+# Agents (from Runner results)
+AGENT_SECONDS = registry.histogram("zylox_agent_duration_seconds", "Runner.run latency per agent", ("agent",))
+AGENT_TOKENS = registry.counter("zylox_agent_tokens_total", "Tokens per agent by kind (input/output/cached/reasoning)", ("agent", "kind"))
+AGENT_REQUESTS = registry.counter("zylox_agent_model_requests_total", "Model requests per agent (Runner turns)", ("agent",))
+SCHEMA_REPAIRS = registry.counter("zylox_schema_repairs_total", "Agent output fields fixed locally before validation", ("schema", "field", "kind"))
+SCHEMA_REPROMPTS = registry.counter("zylox_schema_reprompts_total", "Corrective re-prompts after local repair failed", ("schema",))
+
+# Vector store search
+SEARCH_SECONDS = registry.histogram("zylox_search_duration_seconds", "Upstream vector store search latency", ("store",), SEARCH_BUCKETS)
+SEARCH_RESULTS = registry.histogram("zylox_search_results", "Results returned per vector store search", ("store",), COUNT_BUCKETS)
+SEARCH_ERRORS = registry.counter("zylox_search_errors_total", "Failed vector store searches", ("store",))
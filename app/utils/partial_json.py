@@ -0,0 +1,93 @@
+# Incremental extraction of string fields from a JSON object that is still being generated
+# What this file contains:
+# - JSONFieldStream: fed raw output text chunk by chunk; returns the newly decoded characters of the
+#   selected top-level string fields (e.g. "direct_answer") and when each one is complete.
+#   Single pass, O(1) work per character; anything before the opening "{" (code fences) is ignored.
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class JSONFieldStream:
+    def __init__(self, fields):
+        self.fields = set(fields)
+        self.values: dict[str, str] = {}  # decoded text so far per field
+        self.done: set[str] = set()
+        self._depth = 0
+        self._expect_key = False  # at depth 1: next string is a key (after "{" or ",") rather than a value
+        self._in_string = False
+        self._escape: str | None = None  # None, "" right after a backslash, or "u.." while reading \uXXXX
+        self._surrogate: int | None = None
+        self._key: str | None = None  # last top-level key
+        self._reading_key = False
+        self._capture: str | None = None  # field whose value string is being read
+        self._chars: list[str] = []
+
+    def feed(self, chunk: str) -> list[tuple[str, str, bool]]:
+        """(field, new text, complete) for every selected field that changed in this chunk."""
+        changed: dict[str, list[str]] = {}
+        finished: list[str] = []
+        for c in chunk:
+            if self._in_string:
+                if self._escape is not None:
+                    self._read_escape(c)
+                elif c == "\\":
+                    self._escape = ""
+                elif c == '"':
+                    self._in_string = False
+                    if self._reading_key:
+                        self._key, self._reading_key = "".join(self._chars), False
+                    elif self._capture is not None:
+                        self.done.add(self._capture)
+                        changed.setdefault(self._capture, [])
+                        finished.append(self._capture)
+                        self._capture = None
+                else:
+                    self._append(c)
+                if self._capture is not None and self._chars:
+                    changed.setdefault(self._capture, []).extend(self._chars)
+                    self.values[self._capture] = self.values.get(self._capture, "") + "".join(self._chars)
+                    self._chars = []
+                continue
+            if c == '"':
+                self._in_string, self._chars = True, []
+                if self._depth == 1 and self._expect_key:
+                    self._reading_key = True
+                elif self._depth == 1 and self._key in self.fields and self._key not in self.done:
+                    self._capture = self._key
+            elif c in "{[":
+                self._depth += 1
+                self._expect_key = self._depth == 1 and c == "{"
+            elif c in "}]":
+                self._depth -= 1
+            elif self._depth == 1 and c == ",":
+                self._expect_key = True
+            elif self._depth == 1 and c == ":":
+                self._expect_key = False
+        return [(f, "".join(text), f in finished) for f, text in changed.items()]
+
+    def _append(self, c: str):
+        if self._reading_key or self._capture is not None:
+            self._chars.append(c)
+
+    def _read_escape(self, c: str):
+        if self._escape == "":
+            if c == "u":
+                self._escape = "u"
+            else:
+                self._escape = None
+                self._append(_ESCAPES.get(c, c))
+            return
+        self._escape += c
+        if len(self._escape) < 5:
+            return
+        try:
+            code = int(self._escape[1:], 16)
+        except ValueError:
+            code = 0xFFFD
+        self._escape = None
+        if 0xD800 <= code < 0xDC00:  # high surrogate: wait for its pair
+            self._surrogate = code
+            return
+        if self._surrogate is not None and 0xDC00 <= code < 0xE000:
+            code = 0x10000 + ((self._surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._surrogate = None
+        self._append(chr(code))
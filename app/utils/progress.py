@@ -1,8 +1,126 @@
-# Progress emitter (swap to SSE/WebSockets in prod)
+# Progress emitter + in-process event bus
+# What this file contains:
+# - emit(): logs the stage and publishes it to the current run's channel (if any)
+# - EventBus: per-run channels with a bounded ring buffer so late/reconnecting subscribers can replay
+#   (finished runs kept EVENT_RETENTION_S, at most EVENT_MAX_CHANNELS channels; pruned when channels open/close)
+# - current_run: context variable carrying the run ID through the workflow's tasks
+
+import asyncio
 import json
 import logging
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator
+from app.core.config import settings
+
 log = logging.getLogger("progress")
 
-async def emit(stage: str, payload: dict | None = None):
-    log.info("[progress] %s :: %s", stage, json.dumps(payload or {}))
+current_run: ContextVar[str | None] = ContextVar("current_run", default=None)
+
+@dataclass
+class Event:
+    id: int  # per-run sequence number, starting at 1
+    stage: str
+    data: dict
+    ts: float
+
+class RunChannel:
+    def __init__(self, run_id: str, maxlen: int):
+        self.run_id = run_id
+        self.buffer: deque[Event] = deque(maxlen=maxlen)
+        self.seq = 0
+        self.closed_at: float | None = None
+        self._wake = asyncio.Event()
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_at is not None
+
+    def publish(self, stage: str, data: dict) -> Event:
+        self.seq += 1
+        ev = Event(self.seq, stage, data, time.time())
+        self.buffer.append(ev)
+        self._notify()
+        return ev
+
+    def reopen(self):
+        """A resumed run publishes on its old channel; numbering continues so Last-Event-ID stays valid."""
+        self.closed_at = None
+
+    def close(self):
+        if not self.closed:
+            self.closed_at = time.time()
+            self._notify()
 
+    def _notify(self):
+        # Wake everyone waiting on the current event, then hand out a fresh one
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    async def events(self, after: int = 0, heartbeat: float | None = None) -> AsyncIterator[Event | None]:
+        """Yield buffered events with id > after, then live ones until the channel closes.
+        Yields None every `heartbeat` seconds of silence so callers can send keep-alives.
+        Events that already fell out of the ring buffer are skipped.
+        """
+        while True:
+            wake = self._wake  # grab before reading so a publish in between is not missed
+            for ev in list(self.buffer):
+                if ev.id > after:
+                    after = ev.id
+                    yield ev
+            if self.closed:
+                return
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+class EventBus:
+    def __init__(self, buffer_size: int, retention_s: float, max_channels: int):
+        self.buffer_size = buffer_size
+        self.retention_s = retention_s
+        self.max_channels = max_channels
+        self._channels: dict[str, RunChannel] = {}
+        self._closed: OrderedDict[str, None] = OrderedDict()  # closed run IDs, oldest close first
+
+    def open(self, run_id: str) -> RunChannel:
+        ch = self._channels.get(run_id)
+        if ch is None:
+            ch = self._channels[run_id] = RunChannel(run_id, self.buffer_size)
+            self._prune()
+        return ch
+
+    def get(self, run_id: str) -> RunChannel | None:
+        return self._channels.get(run_id)
+
+    def close(self, run_id: str):
+        ch = self._channels.get(run_id)
+        if ch is not None:
+            ch.close()
+            self._closed[run_id] = None
+            self._closed.move_to_end(run_id)
+            self._prune()
+
+    def _prune(self):
+        # Closed channels stay around for retention_s so reconnecting clients can replay them, unless the
+        # bus is over max_channels. Oldest-closed first, so each call only touches what it drops.
+        cutoff = time.time() - self.retention_s
+        while self._closed:
+            run_id = next(iter(self._closed))
+            ch = self._channels.get(run_id)
+            if ch is not None and ch.closed and ch.closed_at >= cutoff and len(self._channels) <= self.max_channels:
+                return
+            del self._closed[run_id]
+            if ch is not None and ch.closed:  # a reopened (resumed) channel is live again: keep it
+                del self._channels[run_id]
+
+bus = EventBus(settings.EVENT_BUFFER_SIZE, settings.EVENT_RETENTION_S, settings.EVENT_MAX_CHANNELS)
+
+async def emit(stage: str, payload: dict | None = None):
+    payload = payload or {}
+    log.info("[progress] %s :: %s", stage, json.dumps(payload, default=str)[:1000])
+    run_id = current_run.get()
+    if run_id is not None:
+        (bus.get(run_id) or bus.open(run_id)).publish(stage, payload)
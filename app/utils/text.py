@@ -0,0 +1,17 @@
+# Text helpers shared by the local formatter and prompt compaction
+# What this file contains:
+# - clip(): whitespace-collapsed, word-boundary truncation marked with an ellipsis
+
+import re
+
+_WS = re.compile(r"\s+")
+
+def clip(text: str, limit: int) -> str:
+    """Collapse whitespace and cut at a word boundary, marking the cut with an ellipsis."""
+    text = _WS.sub(" ", text or "").strip()
+    if len(text) <= limit:
+        return text
+    cut = text[: limit - 1]
+    if " " in cut[limit // 2:]:
+        cut = cut[: cut.rindex(" ")]
+    return cut.rstrip(" ,;:-") + "…"
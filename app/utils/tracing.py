@@ -0,0 +1,246 @@
+# Per-run span tracing, kept locally (replaces the Agents SDK's hosted trace exporter)
+# What this file contains:
+# - LocalTraceProcessor: an Agents SDK TracingProcessor that buffers each workflow trace's spans in memory
+#   and, when the trace ends, appends them to {TRACE_DIR}/{run_id}.jsonl on a background thread
+# - install(): makes it the SDK's only processor (TRACE_ENABLED=false turns SDK tracing off entirely)
+# - run_trace(): the trace around one run_workflow call; sampled at TRACE_SAMPLE_RATE, an unsampled run
+#   gets a no-op trace, so neither the SDK nor span() records anything for it
+# - span(): a custom span (workflow stages, vector-store searches) that records exceptions as span errors
+# - get_spans() / waterfall(): a run's spans as rows with start offsets, durations, nesting and the critical path
+#
+# The SDK adds its own spans under the current one: an agent span per Runner run, a response span per model
+# call (turn) and a function span per tool invocation. Each JSONL line is one span:
+# {"id", "parent", "name", "type", "start", "end" (unix seconds), "error", "data"}.
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator
+from agents import set_trace_processors, set_tracing_disabled
+from agents.tracing import Span, SpanError, Trace, TracingProcessor, custom_span, get_current_trace, trace
+from app.core.config import settings
+from app.utils.metrics import registry
+
+log = logging.getLogger("tracing")
+
+TRACES = registry.counter("zylox_traces_total", "Workflow runs by tracing decision (sampled/skipped)", ("outcome",))
+TRACE_SPANS = registry.counter("zylox_trace_spans_total", "Spans written to the local trace sink")
+
+_RUN_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_PRUNE_EVERY = 100  # traces written between TRACE_MAX_RUNS passes
+
+def _ts(iso: str | None) -> float | None:
+    return datetime.fromisoformat(iso).timestamp() if iso else None
+
+def _clip(value: Any, limit: int) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[:limit] + "…"
+    if isinstance(value, dict):
+        return {k: _clip(v, limit) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clip(v, limit) for v in value]
+    return value
+
+def _record(span: Span[Any]) -> dict:
+    data = span.span_data
+    exported = dict(data.export() or {})
+    kind = exported.pop("type", data.type)
+    name = exported.pop("name", None) or kind
+    if kind == "custom":
+        exported = exported.get("data") or {}
+    elif kind == "response" and getattr(data, "response", None) is not None:
+        usage = data.response.usage
+        exported.update(model=data.response.model, input_tokens=usage.input_tokens if usage else None,
+                        output_tokens=usage.output_tokens if usage else None)
+    return {
+        "id": span.span_id, "parent": span.parent_id, "name": name, "type": kind,
+        "start": _ts(span.started_at), "end": _ts(span.ended_at), "error": span.error,
+        "data": _clip(exported, settings.TRACE_FIELD_CHARS),
+    }
+
+class LocalTraceProcessor(TracingProcessor):
+    def __init__(self, directory: str, max_runs: int):
+        self.directory = directory
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        self._open: dict[str, tuple[str, list[dict]]] = {}  # trace ID → (run ID, spans so far)
+        self._closed: OrderedDict[str, str] = OrderedDict()  # recently finished trace ID → run ID (late spans)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="traces")
+        self._written = 0
+
+    # --- SDK callbacks (event loop thread; kept to dict/list operations) -------------------------
+
+    def on_trace_start(self, trace: Trace) -> None:
+        run_id = (getattr(trace, "metadata", None) or {}).get("run_id")
+        if run_id:  # only workflow traces; stray Runner calls outside a run are not kept
+            with self._lock:
+                self._open[trace.trace_id] = (run_id, [])
+
+    def on_trace_end(self, trace: Trace) -> None:
+        with self._lock:
+            entry = self._open.pop(trace.trace_id, None)
+            if entry is None:
+                return
+            self._closed[trace.trace_id] = entry[0]
+            while len(self._closed) > 1000:
+                self._closed.popitem(last=False)
+        self._executor.submit(self._append, *entry)
+
+    def on_span_start(self, span: Span[Any]) -> None:
+        pass
+
+    def on_span_end(self, span: Span[Any]) -> None:
+        with self._lock:
+            entry = self._open.get(span.trace_id)
+            if entry is not None:
+                entry[1].append(_record(span))
+                return
+            run_id = self._closed.get(span.trace_id)
+        if run_id:  # ended after its trace (e.g. a cancelled hedge duplicate)
+            self._executor.submit(self._append, run_id, [_record(span)])
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def force_flush(self) -> None:
+        self._executor.submit(lambda: None).result()
+
+    # --- sink (background thread) ------------------------------------------------------------------
+
+    def path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"{run_id}.jsonl")
+
+    def _append(self, run_id: str, spans: list[dict]):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path(run_id), "a") as f:
+                f.write("".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in spans))
+            TRACE_SPANS.inc(len(spans))
+            self._written += 1
+            if self._written % _PRUNE_EVERY == 0:
+                self._prune()
+        except Exception as e:  # tracing must never fail a run
+            log.warning("Trace write for %s failed: %s", run_id, e)
+
+    def _prune(self):
+        files = sorted(os.scandir(self.directory), key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in files[self.max_runs:]:
+            os.remove(entry.path)
+
+    # --- reads ------------------------------------------------------------------------------------
+
+    def spans(self, run_id: str) -> list[dict] | None:
+        """Recorded spans of a run (written and still buffered), or None if it has no trace."""
+        with self._lock:
+            buffered = [s for rid, spans in self._open.values() if rid == run_id for s in spans]
+        try:
+            with open(self.path(run_id)) as f:
+                written = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            written = None
+        if written is None and not buffered:
+            return None
+        return (written or []) + buffered
+
+processor = LocalTraceProcessor(settings.TRACE_DIR, settings.TRACE_MAX_RUNS)
+
+def install():
+    """Route Agents SDK traces to the local sink instead of the hosted exporter."""
+    if settings.TRACE_ENABLED:
+        set_trace_processors([processor])
+    else:
+        set_tracing_disabled(True)
+
+def run_trace(run_id: str, question: str):
+    sampled = settings.TRACE_ENABLED and random.random() < settings.TRACE_SAMPLE_RATE
+    TRACES.inc(outcome="sampled" if sampled else "skipped")
+    return trace("zylox.workflow", trace_id=f"trace_{run_id}", group_id=run_id,
+                 metadata={"run_id": run_id, "question": question[:200]}, disabled=not sampled)
+
+@contextmanager
+def span(name: str, **data: Any) -> Iterator[Span[Any]]:
+    """A custom span under the current one; add attributes via `s.span_data.data[...]`."""
+    # Outside a run (CLI, direct tool calls) there is no trace: a no-op span, without the SDK's error log
+    with custom_span(name, data, disabled=get_current_trace() is None) as s:
+        try:
+            yield s
+        except BaseException as e:  # includes cancellation (dropped roles, losing hedge calls)
+            s.set_error(SpanError(message=type(e).__name__, data={"detail": str(e)[:300]}))
+            raise
+
+async def get_spans(run_id: str) -> list[dict] | None:
+    if not _RUN_ID.match(run_id):
+        return None
+    return await asyncio.get_running_loop().run_in_executor(processor._executor, processor.spans, run_id)
+
+def _critical(span_id: str, end: float, children: dict[str, list[dict]], path: set[str]):
+    """Walk back from `end`: the child that finished last gated its parent, then whatever finished
+    last before that child started, and so on; recurse into each."""
+    kids = sorted(children.get(span_id, []), key=lambda s: s["end"])
+    cursor = end
+    while kids:
+        gating = [s for s in kids if s["end"] <= cursor + 1e-3]
+        if not gating:
+            return
+        last = gating[-1]
+        path.add(last["id"])
+        _critical(last["id"], last["end"], children, path)
+        cursor = last["start"]
+        kids = [s for s in gating[:-1] if s["end"] <= cursor + 1e-3]
+
+def waterfall(run_id: str, spans: list[dict]) -> dict:
+    """Spans in tree order with offsets from the first start, depth, and the critical path marked."""
+    spans = [s for s in spans if s.get("start") is not None and s.get("end") is not None]
+    if not spans:
+        return {"run_id": run_id, "total_ms": 0, "spans": [], "critical_path": []}
+    ids = {s["id"] for s in spans}
+    children: dict[str, list[dict]] = {}
+    for s in spans:
+        children.setdefault(s["parent"] if s["parent"] in ids else "", []).append(s)
+    critical: set[str] = set()
+    for root in children.get("", []):
+        critical.add(root["id"])
+        _critical(root["id"], root["end"], children, critical)
+
+    ordered: list[tuple[dict, int]] = []  # depth-first, siblings by start time
+
+    def walk(parent: str, depth: int):
+        for s in sorted(children.get(parent, []), key=lambda s: s["start"]):
+            ordered.append((s, depth))
+            walk(s["id"], depth + 1)
+    walk("", 0)
+
+    t0 = min(s["start"] for s in spans)
+    rows = [{
+        "id": s["id"], "parent": s["parent"], "depth": depth, "name": s["name"], "type": s["type"],
+        "offset_ms": round((s["start"] - t0) * 1000, 1), "duration_ms": round((s["end"] - s["start"]) * 1000, 1),
+        "critical": s["id"] in critical, "error": s.get("error"), "data": s.get("data") or {},
+    } for s, depth in ordered]
+    return {
+        "run_id": run_id,
+        "total_ms": round((max(s["end"] for s in spans) - t0) * 1000, 1),
+        "spans": rows,
+        "critical_path": [r["name"] for r in rows if r["critical"]],
+    }
+
+def render_text(view: dict, width: int = 60) -> str:
+    """The waterfall as fixed-width text bars; critical-path spans are marked with '*'."""
+    total = view["total_ms"] or 1
+    lines = [f"run {view['run_id']}  total {view['total_ms']:.0f} ms  (* = critical path)"]
+    for r in view["spans"]:
+        start = int(r["offset_ms"] / total * width)
+        length = max(1, int(r["duration_ms"] / total * width))
+        bar = " " * start + ("█" if r["critical"] else "▒") * min(length, width - start)
+        label = ("  " * r["depth"] + r["name"])[:40]
+        flag = "*" if r["critical"] else " "
+        error = f"  ! {r['error']['message']}" if r["error"] else ""
+        lines.append(f"{flag} {label:<40} {r['offset_ms']:>9.0f} {r['duration_ms']:>9.0f} ms |{bar:<{width}}|{error}")
+    return "\n".join(lines) + "\n"
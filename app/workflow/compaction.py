@@ -0,0 +1,96 @@
+# Token-budgeted digests of role answers (and the debate) for the debate/combine prompts
+# What this file contains:
+# - compact_answers(): one digest per role within a shared token budget, split by classifier weight
+# - compact_debate(): the same trimming for the debate JSON handed to the combiner
+# - Key fields (confidence, provenance, needs_data, anything risk-related, IDs/severities) are kept verbatim;
+#   only free text is shortened, word-boundary clipped with an ellipsis
+# Token counts are estimated at ~4 characters per token (same heuristic as the limiter).
+
+import json
+from app.schemas.classifier import ClassifierSchema
+from app.utils.text import clip
+
+CHARS_PER_TOKEN = 4
+MIN_FIELD_CHARS = 40  # a clipped string never gets shorter than this
+
+# Never trimmed, at any depth
+KEY_FIELDS = {
+    "confidence", "provenance", "needs_data",
+    # debate
+    "id", "severity", "weight_impact", "roles_involved", "status", "role", "overall_risk_score",
+}
+
+def estimate_tokens(value) -> int:
+    return -(-len(_dumps(value)) // CHARS_PER_TOKEN)
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def _is_key(field: str) -> bool:
+    return field in KEY_FIELDS or "risk" in field
+
+def _free_chars(value) -> int:
+    """Characters of trimmable text in value."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, list):
+        return sum(_free_chars(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_free_chars(v) for k, v in value.items() if not _is_key(k))
+    return 0
+
+def _trim(value, factor: float):
+    if isinstance(value, str):
+        return clip(value, max(MIN_FIELD_CHARS, int(len(value) * factor)))
+    if isinstance(value, list):
+        return [_trim(v, factor) for v in value]
+    if isinstance(value, dict):
+        return {k: v if _is_key(k) else _trim(v, factor) for k, v in value.items()}
+    return value
+
+def _fit(value: dict, free_budget: int) -> dict:
+    free = _free_chars(value)
+    if free <= free_budget:
+        return value
+    return _trim(value, max(free_budget, 0) / free)
+
+def _shares(weights: dict[str, float], free: dict[str, int], budget: int, min_share: float) -> dict[str, int]:
+    """Split `budget` characters by weight; roles needing less than their share give the rest back."""
+    alloc: dict[str, int] = {}
+    open_roles = dict(weights)
+    remaining = budget
+    while open_roles:
+        total = sum(open_roles.values()) or 1.0
+        share = {r: max(min_share, w / total) for r, w in open_roles.items()}
+        norm = sum(share.values())
+        offer = {r: int(remaining * s / norm) for r, s in share.items()}
+        satisfied = [r for r in open_roles if free[r] <= offer[r]]
+        if not satisfied:
+            alloc.update(offer)
+            break
+        for r in satisfied:
+            alloc[r] = free[r]
+            remaining -= free[r]
+            del open_roles[r]
+    return alloc
+
+def compact_answers(answers: dict[str, dict], weights: ClassifierSchema, budget_tokens: int,
+                    min_share: float = 0.05) -> tuple[dict[str, dict], dict]:
+    """Digest of each role answer within budget_tokens in total. Returns (digests, size stats)."""
+    before = estimate_tokens(answers)
+    if before <= budget_tokens:
+        return answers, {"before_tokens": before, "after_tokens": before, "budget_tokens": budget_tokens}
+    free = {role: _free_chars(a) for role, a in answers.items()}
+    fixed = len(_dumps(answers)) - sum(free.values())  # keys, punctuation and key fields
+    w = weights.model_dump()
+    alloc = _shares({role: float(w.get(role, 0)) for role in answers}, free,
+                    budget_tokens * CHARS_PER_TOKEN - fixed, min_share)
+    digests = {role: _fit(a, alloc[role]) for role, a in answers.items()}
+    return digests, {"before_tokens": before, "after_tokens": estimate_tokens(digests), "budget_tokens": budget_tokens}
+
+def compact_debate(debate: dict, budget_tokens: int) -> tuple[dict, dict]:
+    """Debate JSON trimmed to budget_tokens (issue IDs, severities and risk fields kept). Returns (digest, stats)."""
+    before = estimate_tokens(debate)
+    fixed = len(_dumps(debate)) - _free_chars(debate)
+    digest = _fit(debate, budget_tokens * CHARS_PER_TOKEN - fixed)
+    return digest, {"before_tokens": before, "after_tokens": estimate_tokens(digest), "budget_tokens": budget_tokens}
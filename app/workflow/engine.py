@@ -1,57 +1,143 @@
 # Workflow orchestrator
 # What this file contains:
 # - Deterministic chain using the Agents SDK agents from app/agents/roles.py
-# - Calls classifier → runs role agents (with tool calling) → debate → combine → formatter
-# - Strict schema validation using OpenAI JSON mode + Pydantic
-# - Progress events via app/utils/progress.py
+# - Calls classifier ∥ role agents → compact → debate → combine → formatter
+# - Role context is prefetched (RETRIEVAL_MODE=prefetch) or pulled via tool calling (RETRIEVAL_MODE=tools)
+# - Stages run on the dependency scheduler in app/workflow/scheduler.py
+# - Role calls have soft (hedge) / hard (drop) deadlines; the run degrades to the roles that finished
+# - Strict schema validation using OpenAI JSON mode + Pydantic; invalid output is repaired locally first,
+#   then re-prompted once (app/schemas/repair.py)
+# - Finished runs are kept in app/services/sessions.py so follow-ups can reuse their role outputs
+# - Every stage output is checkpointed to the run ledger (app/services/ledger.py); a resumed run restores
+#   the recorded stages and only runs the missing ones
+# - Progress events via app/utils/progress.py (per-run channels; the result is the last event)
+# - Combiner / Formatter agents run streamed; their answer fields go out as "{stage}:delta" events (STREAM_TOKENS)
+# - Classifier weights come from the local fast-path router (app/workflow/local_router.py) when it is
+#   confident; otherwise from the Classifier agent
+# - Sampled runs are traced (app/utils/tracing.py): a span per stage, plus the SDK's agent / model-call /
+#   tool spans under it, written to the local trace sink
 
 import json
+import time
+import uuid
 import asyncio
+from typing import Any, Awaitable, Callable
 from fastapi import HTTPException
-from agents import Runner, set_default_openai_client
-from app.services.openai_client import client as openai_client
-from app.schemas.classifier import ClassifierSchema
+from pydantic import BaseModel, ValidationError
+from agents import ModelBehaviorError, Runner
+from app.services.openai_client import get_client
+from app.schemas.classifier import BatchClassifierSchema, ClassifierSchema
 from app.schemas.roles import (
     LegalSchema, MarketingSchema, OperationsSchema,
     StrategySchema, AnalystSchema, FinanceSchema
 )
 from app.schemas.debate import AddDebateSchema
 from app.schemas.combined import CombinerSchema, FormatterSchema
-from app.utils.progress import emit
+from app.schemas.repair import RepairFailed, repair
+from app.agents.output import record_repairs
+from app.core.config import settings
+from app.utils.metrics import (
+    AGENT_REQUESTS, AGENT_SECONDS, AGENT_TOKENS, HEDGES, ROLE_OUTCOMES, SCHEMA_REPROMPTS,
+    STAGE_SECONDS, WORKFLOW_SECONDS, WORKFLOWS, WORKFLOWS_IN_FLIGHT,
+)
+from app.services.ledger import ledger
+from app.services.limiter import fatal, transient
+from app.services.sessions import SessionRun, sessions
+from app.utils.hedging import hedged
+from app.utils import tracing
+from app.utils.progress import bus, current_run, emit
+from app.tools.retrieval import retrieve_for_role
+from app.workflow.compaction import compact_answers, compact_debate
+from app.workflow.formatter import format_local
+from app.workflow import local_router
+from app.workflow.routing import select_roles
+from app.workflow.scheduler import Stage, run_stages
+from app.workflow.streaming import FieldStreamer
+from app.agents import profiles
 from app.agents.roles import (
-    classifier_agent, legal_agent, marketing_agent, ops_agent,
+    classifier_agent, classifier_batch_agent, legal_agent, marketing_agent, ops_agent,
     strategy_agent, analyst_agent, finance_agent, debate_agent,
     combiner_agent, formatter_agent
 )
 
-# Set the default OpenAI client for the Agents SDK
-set_default_openai_client(openai_client)
+# Make sure the Agents SDK has the shared client even outside the app (bench, CLI); the app lifespan replaces it
+get_client()
+tracing.install()
+
+async def _consume(result, on_text: Callable[[str], Awaitable[None]]):
+    async for event in result.stream_events():
+        if event.type == "raw_response_event" and event.data.type == "response.output_text.delta":
+            await on_text(event.data.delta)
+
+async def _run(agent, user_text: str, on_text: Callable[[str], Awaitable[None]] | None = None):
+    """Runner.run with the current profile's model settings, plus per-agent latency and token accounting.
+    With `on_text` the run is streamed and every output text delta is passed to it as it arrives."""
+    agent, cfg = profiles.apply(agent)
+    t0 = time.perf_counter()
+    try:
+        if on_text is None:
+            runner = Runner()
+            result = await asyncio.wait_for(runner.run(starting_agent=agent, input=user_text), cfg.timeout_s)
+        else:
+            result = Runner.run_streamed(starting_agent=agent, input=user_text)
+            try:
+                await asyncio.wait_for(_consume(result, on_text), cfg.timeout_s)
+            except BaseException:
+                result.cancel()
+                raise
+    except TimeoutError as e:
+        if cfg.timeout_s is None:
+            raise
+        raise profiles.AgentTimeout(agent.name, cfg.timeout_s) from e
+    AGENT_SECONDS.observe(time.perf_counter() - t0, agent=agent.name)
+    usage = result.context_wrapper.usage
+    AGENT_REQUESTS.inc(usage.requests, agent=agent.name)
+    AGENT_TOKENS.inc(usage.input_tokens, agent=agent.name, kind="input")
+    AGENT_TOKENS.inc(usage.output_tokens, agent=agent.name, kind="output")
+    AGENT_TOKENS.inc(usage.input_tokens_details.cached_tokens, agent=agent.name, kind="cached")
+    AGENT_TOKENS.inc(usage.output_tokens_details.reasoning_tokens, agent=agent.name, kind="reasoning")
+    return result
 
-async def _json(agent, system_instructions: str, user_text: str, schema):
+async def _json(agent, system_instructions: str, user_text: str, schema,
+                on_text: Callable[[str], Awaitable[None]] | None = None):
     """Invoke an Agent and parse strict JSON into a Pydantic schema.
     Uses Agents SDK Runner.run() with a string input. The agent's instructions are already set.
     With output_type configured, final_output should already be a Pydantic instance.
+    `on_text` streams the run (see _run); the validated object is still returned at the end.
+    Output that fails validation is repaired locally (app/agents/output.py); only if that fails is the agent
+    asked once to correct it (SCHEMA_REPROMPT), given the broken output and the errors instead of the full prompt.
     """
-    runner = Runner()
-    result = await runner.run(starting_agent=agent, input=user_text)
-    
+    try:
+        result = await _run(agent, user_text, on_text)
+    except ModelBehaviorError as e:
+        # The agent's RepairingOutputSchema could not fix the output: one corrective re-prompt
+        raw = getattr(e, "raw_output", None)
+        if raw is None or not settings.SCHEMA_REPROMPT:
+            raise
+        SCHEMA_REPROMPTS.inc(schema=schema.__name__)
+        fix_user = (
+            f"Your previous answer did not validate as {schema.__name__}.\n"
+            f"Errors: {e.repair_error[:1000]}\n"
+            f"Previous answer: {raw[:12000]}\n"
+            "Return the corrected JSON only, keeping the content."
+        )
+        result = await _run(agent, fix_user)
+
     # Get the final output from the result - should already be a Pydantic object
     if result.final_output is None:
         raise HTTPException(status_code=500, detail="Empty model response")
-    
-    # If it's already a Pydantic model, return it; otherwise parse and validate
     if isinstance(result.final_output, schema):
         return result.final_output
-    elif isinstance(result.final_output, dict):
-        return schema.model_validate(result.final_output)
-    else:
-        # Fallback: try to parse as JSON string
-        data = json.loads(str(result.final_output))
-        return schema.model_validate(data)
+    # Agents without a structured output type: same local repair
+    try:
+        value, repairs = repair(result.final_output, schema)
+    except RepairFailed as e:
+        raise ValueError(f"{agent.name} output is not valid {schema.__name__}: {e}") from e
+    record_repairs(schema, repairs)
+    return value
 
 async def _text(agent, user_text: str) -> str:
-    runner = Runner()
-    result = await runner.run(starting_agent=agent, input=user_text)
+    result = await _run(agent, user_text)
     
     # Get the final output from the result
     text = str(result.final_output) if result.final_output else ""
@@ -59,77 +145,373 @@ async def _text(agent, user_text: str) -> str:
         raise HTTPException(status_code=500, detail="Empty model response")
     return text.strip()
 
-async def run_workflow(question: str):
-    # 1) Classifier (weights that sum to 100)
-    await emit("classifier:start", {"q": question})
-    classifier_user = (
+# Role agents in response order: (stage name, agent, schema)
+ROLE_SPECS = [
+    ("legal", legal_agent, LegalSchema),
+    ("marketing", marketing_agent, MarketingSchema),
+    ("operations", ops_agent, OperationsSchema),
+    ("strategy", strategy_agent, StrategySchema),
+    ("analyst", analyst_agent, AnalystSchema),
+    ("finance", finance_agent, FinanceSchema),
+]
+ROLE_NAMES = [name for name, _, _ in ROLE_SPECS]
+
+# Stages whose output is a schema object (rebuilt from the ledger's JSON on resume)
+STAGE_SCHEMAS: dict[str, type[BaseModel]] = {
+    "classifier": ClassifierSchema,
+    **{name: schema for name, _, schema in ROLE_SPECS},
+    "debate": AddDebateSchema,
+    "combine": CombinerSchema,
+    "format": FormatterSchema,
+}
+
+# Prefetch mode hands each role its context up front, so the agent answers in one turn
+# without a tool round trip; these are the same agents minus their retrieval tools.
+_NO_TOOL_AGENTS = {name: agent.clone(tools=[]) for name, agent, _ in ROLE_SPECS}
+
+# Answer fields streamed as "{stage}:delta" events while the Combiner / Formatter are still generating
+_STREAM_FIELDS = {
+    "combine": ("direct_answer",),
+    "format": ("title", "tldr", "decision"),
+}
+
+def _first_text(stream: FieldStreamer | None) -> dict:
+    if stream is None or stream.first_delta_s is None:
+        return {}
+    return {"first_text_ms": round(stream.first_delta_s * 1000, 1)}
+
+def _classifier_prompt(question: str) -> str:
+    return (
         "Return JSON with keys: legal, marketing, operations, strategy, analyst, finance. "
         "Numbers must sum to 100. Round as needed.\n"
         f'Question: "{question}"'
     )
-    weights: ClassifierSchema = await _json(classifier_agent, classifier_agent.instructions, classifier_user, ClassifierSchema)
+
+async def classify(question: str) -> ClassifierSchema:
+    weights: ClassifierSchema = await _json(classifier_agent, classifier_agent.instructions, _classifier_prompt(question), ClassifierSchema)
     weights = weights.normalized()
-    await emit("classifier:end", {"weights": weights.model_dump()})
+    weights._source = "llm"
+    return weights
 
-    # 2) Role agents (with tool calling). Each role agent will call its retrieval tool as needed.
-    async def role_call(agent, role_name: str, schema):
-        await emit(f"{role_name}:start")
-        user = (
-            f"From a {role_name.capitalize()} perspective, analyze: \"{question}\".\n"
-            "Use your role-private retrieval tool first to ground your answer.\n"
-            "Output ONLY your role JSON."
-        )
-        out = await _json(agent, agent.instructions, user, schema)
-        await emit(f"{role_name}:end")
+async def route_question(question: str) -> ClassifierSchema:
+    """The local router's weights when it is confident, else the Classifier agent's."""
+    return local_router.predict(question) or await classify(question)
+
+async def classify_batch(questions: list[str]) -> list[ClassifierSchema]:
+    """Classify several questions in one ClassifierBatch call (normalized, input order).
+    Raises ValueError if the model returns the wrong number of items."""
+    user = (
+        "For each question, return JSON with keys: legal, marketing, operations, strategy, analyst, finance. "
+        "Numbers must sum to 100. Round as needed.\n"
+        + "\n".join(f"{i + 1}. {json.dumps(q, ensure_ascii=False)}" for i, q in enumerate(questions))
+    )
+    out: BatchClassifierSchema = await _json(classifier_batch_agent, classifier_batch_agent.instructions, user, BatchClassifierSchema)
+    if len(out.items) != len(questions):
+        raise ValueError(f"batch classifier returned {len(out.items)} items for {len(questions)} questions")
+    weights = [w.normalized() for w in out.items]
+    for w in weights:
+        w._source = "llm"
+    return weights
+
+def _checkpointed(stage: Stage, restore: dict[str, Any]) -> Stage:
+    """The stage with its output recorded in the ledger, or, if already recorded, replaced by that output."""
+    if stage.name in restore:
+        value = restore[stage.name]
+
+        async def restored(_):
+            return value
+        return Stage(stage.name, restored)
+
+    async def run(inputs):
+        with tracing.span(f"stage:{stage.name}", stage=stage.name, deps=list(stage.deps)):
+            out = await stage.fn(inputs)
+        ledger.record(current_run.get(), stage.name, out)
         return out
+    return Stage(stage.name, run, stage.deps)
 
-    tasks = [
-        role_call(legal_agent, "legal", LegalSchema),
-        role_call(marketing_agent, "marketing", MarketingSchema),
-        role_call(ops_agent, "operations", OperationsSchema),
-        role_call(strategy_agent, "strategy", StrategySchema),
-        role_call(analyst_agent, "analyst", AnalystSchema),
-        role_call(finance_agent, "finance", FinanceSchema),
-    ]
+def _plan(stages: list[Stage], restore: dict[str, Any]) -> list[Stage]:
+    """Checkpointed stages, minus those only restored stages consumed (e.g. a restored role's retrieval)."""
+    plan = [_checkpointed(s, restore) for s in stages]
+    consumed = {d for s in stages for d in s.deps}
+    while True:
+        needed = {d for s in plan for d in s.deps}
+        unused = [s for s in plan if s.name not in restore and s.name in consumed and s.name not in needed]
+        if not unused:
+            return plan
+        plan = [s for s in plan if s not in unused]
 
-    legal, marketing, operations, strategy, analyst, finance = await asyncio.gather(*tasks)
-    answers = {
-        "legal": legal.model_dump(),
-        "marketing": marketing.model_dump(),
-        "operations": operations.model_dump(),
-        "strategy": strategy.model_dump(),
-        "analyst": analyst.model_dump(),
-        "finance": finance.model_dump(),
-    }
-    await emit("roles:end")
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+# Strong refs to background runs so they are not garbage-collected mid-flight
+_background: set[asyncio.Task] = set()
+
+def start_workflow(question: str, **kwargs) -> str:
+    """Start run_workflow in the background and return its run ID.
+    The run's channel is opened first, so subscribers can attach before the first event.
+    """
+    run_id = new_run_id()
+    bus.open(run_id)
+    task = asyncio.create_task(run_workflow(question, run_id=run_id, **kwargs))
+    _background.add(task)
+    # Failures are already published as an "error" event; just mark them retrieved
+    task.add_done_callback(lambda t: (_background.discard(t), t.cancelled() or t.exception()))
+    return run_id
+
+async def run_workflow(question: str, routing: str | None = None, run_id: str | None = None,
+                       classifier: Callable[[], Awaitable[ClassifierSchema]] | None = None,
+                       profile: str | None = None, reuse: dict[str, BaseModel] | None = None,
+                       parent: str | None = None, restore: dict[str, Any] | None = None):
+    """Run the full chain. Progress goes to the run's event channel; the result is also
+    published as the channel's last event ("final"), or "error" if the run fails.
+    `classifier` replaces the classifier call (e.g. a share of a classify_batch call in /ask/batch).
+    `profile` picks the agent model profile (default settings.AGENT_PROFILE).
+    `reuse` holds role outputs taken as-is instead of calling those agents (follow-ups; `parent` is the run they came from).
+    `restore` holds stage outputs already recorded for this run ID (resume); those stages are not run again.
+    """
+    profile = profile or settings.AGENT_PROFILE
+    if profile not in profiles.profiles:
+        raise ValueError(f"Unknown profile {profile!r}")
+    run_id = run_id or new_run_id()
+    models: dict[str, dict] = {}
+    profile_token = profiles.current_profile.set((profile, models))
+    token = current_run.set(run_id)
+    channel = bus.open(run_id)
+    if restore is not None:
+        channel.reopen()
+    ledger.start_run(run_id, question, routing or settings.ROUTING_MODE, profile, parent)
+    WORKFLOWS_IN_FLIGHT.inc()
+    t0 = time.perf_counter()
+    try:
+        with tracing.run_trace(run_id, question), tracing.span("run_workflow", routing=routing or settings.ROUTING_MODE,
+                                                                profile=profile, resumed=restore is not None):
+            result = await _workflow(question, routing, classifier, reuse, restore)
+        result["run_id"] = run_id
+        result["profile"] = {"name": profile, "models": models}  # agents actually called, with their settings
+        sessions.set(run_id, SessionRun(run_id, question, result["routing"]["mode"], profile,
+                                        result["weights"], result["roles"], parent))
+        WORKFLOWS.inc(status="ok")
+        ledger.finish(run_id, "ok")
+        await emit("final", result)
+        return result
+    except Exception as e:
+        WORKFLOWS.inc(status="error")
+        ledger.finish(run_id, "error", f"{type(e).__name__}: {str(e)[:500]}")
+        await emit("error", {"error": type(e).__name__, "detail": str(e)})
+        raise
+    finally:
+        WORKFLOWS_IN_FLIGHT.dec()
+        WORKFLOW_SECONDS.observe(time.perf_counter() - t0)
+        bus.close(run_id)
+        current_run.reset(token)
+        profiles.current_profile.reset(profile_token)
+
+async def _workflow(question: str, routing: str | None, classifier: Callable[[], Awaitable[ClassifierSchema]] | None = None,
+                    reuse: dict[str, BaseModel] | None = None, restore: dict[str, Any] | None = None):
+    # Stages start as soon as their real inputs are ready: role agents never read the
+    # classifier weights, so they run alongside the classifier instead of after it.
+    # Pruned routing modes are the exception: roles then wait for the router's pick.
+    routing = routing or settings.ROUTING_MODE
+    pruned = routing != "all"
+    prefetch = settings.RETRIEVAL_MODE == "prefetch"
+    reuse = reuse or {}
+    restore = restore or {}
+    if "classifier" in restore and isinstance(restore.get("router"), dict):
+        restore["classifier"]._source = restore["router"].get("source")
+
+    # 0) Retrieval prefetch: with "all" routing every role search starts immediately, alongside the
+    # classifier. Pruned routing trades that overlap for fewer searches: each waits for the router's
+    # pick and is skipped for roles that won't run.
+    def retrieval_stage(role_name: str):
+        async def retrieve(inputs):
+            if pruned and role_name not in inputs["route"]:
+                await emit(f"retrieval:{role_name}:skipped", {"mode": routing})
+                return ""
+            context = await retrieve_for_role(role_name, question)
+            await emit(f"retrieval:{role_name}:end", {"chars": len(context)})
+            return context
+        return retrieve
+
+    # 1) Classifier (weights that sum to 100)
+    async def classifier_stage(_):
+        await emit("classifier:start", {"q": question})
+        weights = await (classifier or (lambda: route_question(question)))()
+        source = weights._source or "provided"
+        local_router.ROUTER_DECISIONS.inc(source=source)
+        ledger.record(current_run.get(), "router", {"source": source})
+        await emit("classifier:end", {"weights": weights.model_dump(), "source": source})
+        return weights
+
+    async def route_stage(inputs):
+        selected = select_roles(inputs["classifier"], routing, settings.ROUTING_WEIGHT_FLOOR)
+        await emit("route:end", {"mode": routing, "roles": selected})
+        return selected
+
+    # 2) Role agents (with tool calling). Each role agent will call its retrieval tool as needed.
+    def role_stage(agent, role_name: str, schema):
+        async def role_call(inputs):
+            if role_name in reuse:
+                await emit(f"{role_name}:reused")
+                return reuse[role_name]
+            if pruned and role_name not in inputs["route"]:
+                await emit(f"{role_name}:skipped", {"mode": routing})
+                return {"status": "skipped", "reason": f"not selected by {routing} routing"}
+            await emit(f"{role_name}:start")
+            if prefetch:
+                run_agent = _NO_TOOL_AGENTS[role_name]
+                user = (
+                    f"From a {role_name.capitalize()} perspective, analyze: \"{question}\".\n"
+                    "Role-private context (already retrieved from your vector store):\n"
+                    f"{inputs[f'retrieval:{role_name}']}\n"
+                    "Ground your answer in this context.\n"
+                    "Output ONLY your role JSON."
+                )
+            else:
+                run_agent = agent
+                user = (
+                    f"From a {role_name.capitalize()} perspective, analyze: \"{question}\".\n"
+                    "Use your role-private retrieval tool first to ground your answer.\n"
+                    "Output ONLY your role JSON."
+                )
+            soft_s, hard_s = settings.ROLE_DEADLINES_S.get(role_name, (settings.ROLE_SOFT_DEADLINE_S, settings.ROLE_HARD_DEADLINE_S))
+
+            async def on_hedge(reason: str):
+                HEDGES.inc(role=role_name, reason=reason)
+                await emit(f"{role_name}:hedge", {"reason": reason})
+
+            try:
+                res = await hedged(lambda: _json(run_agent, run_agent.instructions, user, schema), soft_s, hard_s, on_hedge,
+                                   retryable=transient)
+            except profiles.AgentTimeout as e:  # every attempt hit the profile's timeout_s
+                ROLE_OUTCOMES.inc(role=role_name, outcome="timed_out")
+                await emit(f"{role_name}:timed_out", {"agent_timeout_s": e.timeout_s})
+                return {"status": "timed_out", "reason": str(e)}
+            except TimeoutError:
+                ROLE_OUTCOMES.inc(role=role_name, outcome="timed_out")
+                await emit(f"{role_name}:timed_out", {"hard_deadline_s": hard_s})
+                return {"status": "timed_out", "reason": f"no answer within the {hard_s:g}s hard deadline"}
+            except Exception as e:
+                if fatal(e):  # bad key / permission / no credits: every role would fail the same way
+                    raise
+                ROLE_OUTCOMES.inc(role=role_name, outcome="failed")
+                await emit(f"{role_name}:failed", {"error": type(e).__name__, "detail": str(e)[:200]})
+                return {"status": "failed", "reason": f"{type(e).__name__}: {str(e)[:200]}"}
+            ROLE_OUTCOMES.inc(role=role_name, outcome="hedge_won" if res.winner == "hedge" else "ok")
+            out = res.value
+            await emit(f"{role_name}:end", {"output": out.model_dump(), "hedged": res.hedged, "winner": res.winner})
+            return out
+        return role_call
+
+    async def roles_stage(inputs):
+        # Only roles that actually ran go into the debate/combine prompts
+        answers = {name: inputs[name].model_dump() for name in ROLE_NAMES if isinstance(inputs[name], BaseModel)}
+        if not answers:
+            raise RuntimeError("No role produced an answer (all skipped, failed or timed out)")
+        await emit("roles:end", {"ran": list(answers)})
+        return answers
+
+    # 2b) Compaction: one weighted, token-budgeted digest of the role answers, shared by debate and combine
+    async def compact_stage(inputs):
+        if not settings.COMPACT_ENABLED:
+            return inputs["roles"]
+        digests, stats = compact_answers(inputs["roles"], inputs["classifier"], settings.COMPACT_ROLES_TOKENS,
+                                         settings.COMPACT_MIN_SHARE)
+        await emit("compact:end", stats)  # logged with the run's progress: size before/after
+        return digests
 
     # 3) Debate
-    await emit("debate:start")
-    debate_user = f"User question: {question}\nWeights: {weights.model_dump_json()}\nAnswers: {json.dumps(answers, ensure_ascii=False)}"
-    debate: AddDebateSchema = await _json(debate_agent, debate_agent.instructions, debate_user, AddDebateSchema)
-    await emit("debate:end", {"risk_score": debate.overall_risk_score})
+    async def debate_stage(inputs):
+        weights: ClassifierSchema = inputs["classifier"]
+        answers = inputs["compact"]
+        await emit("debate:start")
+        debate_user = f"User question: {question}\nWeights: {weights.model_dump_json()}\nAnswers: {json.dumps(answers, ensure_ascii=False)}"
+        debate: AddDebateSchema = await _json(debate_agent, debate_agent.instructions, debate_user, AddDebateSchema)
+        await emit("debate:end", {"risk_score": debate.overall_risk_score})
+        return debate
 
     # 4) Combine
-    await emit("combine:start")
-    combine_user = (
-        f"Question: {question}\n"
-        f"Weights: {weights.model_dump_json()}\n"
-        f"Answers: {json.dumps(answers, ensure_ascii=False)}\n"
-        f"Debate: {debate.model_dump_json()}"
-    )
-    combined: CombinerSchema = await _json(combiner_agent, combiner_agent.instructions, combine_user, CombinerSchema)
-    await emit("combine:end", {"confidence": combined.confidence})
+    async def combine_stage(inputs):
+        weights: ClassifierSchema = inputs["classifier"]
+        debate: AddDebateSchema = inputs["debate"]
+        answers = inputs["compact"]
+        await emit("combine:start")
+        debate_json = debate.model_dump()
+        if settings.COMPACT_ENABLED:
+            debate_json, stats = compact_debate(debate_json, settings.COMPACT_DEBATE_TOKENS)
+            await emit("compact:debate", stats)
+        combine_user = (
+            f"Question: {question}\n"
+            f"Weights: {weights.model_dump_json()}\n"
+            f"Answers: {json.dumps(answers, ensure_ascii=False)}\n"
+            f"Debate: {json.dumps(debate_json, ensure_ascii=False)}"
+        )
+        stream = FieldStreamer("combine", _STREAM_FIELDS["combine"]) if settings.STREAM_TOKENS else None
+        combined: CombinerSchema = await _json(combiner_agent, combiner_agent.instructions, combine_user, CombinerSchema, stream)
+        if stream:
+            await stream.flush()
+        await emit("combine:end", {"confidence": combined.confidence, **_first_text(stream)})
+        return combined
+
+    # 5) Formatter: local mapping, the Formatter agent, or local with the agent as fallback
+    async def format_stage(inputs):
+        combined: CombinerSchema = inputs["combine"]
+        mode = settings.FORMATTER_MODE
+        await emit("format:start", {"mode": mode})
+        if mode in ("local", "hybrid"):
+            try:
+                formatted = format_local(combined, inputs["roles"])
+                await emit("format:end", {"mode": "local", "output": formatted.model_dump()})
+                return formatted
+            except (ValueError, ValidationError) as e:
+                if mode == "local":
+                    raise
+                await emit("format:fallback", {"error": str(e)[:200]})
+        stream = FieldStreamer("format", _STREAM_FIELDS["format"]) if settings.STREAM_TOKENS else None
+        formatted: FormatterSchema = await _json(formatter_agent, formatter_agent.instructions, f"final_json:\n{combined.model_dump_json()}",
+                                                 FormatterSchema, stream)
+        if stream:
+            await stream.flush()
+        await emit("format:end", {"mode": "llm", "output": formatted.model_dump(), **_first_text(stream)})
+        return formatted
 
-    # 5) Formatter (structured output)
-    await emit("format:start")
-    formatted: FormatterSchema = await _json(formatter_agent, formatter_agent.instructions, f"final_json:\n{combined.model_dump_json()}", FormatterSchema)
-    await emit("format:end")
+    def role_deps(role_name: str) -> tuple[str, ...]:
+        if role_name in reuse:
+            return ()
+        return (("route",) if pruned else ()) + ((f"retrieval:{role_name}",) if prefetch else ())
+
+    stages = [
+        *(Stage(f"retrieval:{name}", retrieval_stage(name), ("route",) if pruned else ())
+          for name in (ROLE_NAMES if prefetch else []) if name not in reuse),
+        Stage("classifier", classifier_stage),
+        *([Stage("route", route_stage, ("classifier",))] if pruned else []),
+        *(Stage(name, role_stage(agent, name, schema), role_deps(name)) for name, agent, schema in ROLE_SPECS),
+        Stage("roles", roles_stage, tuple(ROLE_NAMES)),
+        Stage("compact", compact_stage, ("classifier", "roles")),
+        Stage("debate", debate_stage, ("classifier", "compact")),
+        Stage("combine", combine_stage, ("classifier", "compact", "debate")),
+        Stage("format", format_stage, ("combine", "roles")),
+    ]
+    if restore:
+        await emit("resume:start", {"restored": [s.name for s in stages if s.name in restore]})
+    out, report = await run_stages(_plan(stages, restore))
+    for name, timing in report.timings.items():
+        STAGE_SECONDS.observe(timing.duration, stage=name)
+    await emit("workflow:end", {"critical_path": report.critical_path, "total_ms": round(report.total * 1000, 1)})
 
     return {
-        "formatted": formatted.model_dump(),
-        "weights": weights.model_dump(),
-        "debate": debate.model_dump(),
-        "combined": combined.model_dump(),
-        "roles": answers
+        "formatted": out["format"].model_dump(),
+        "weights": out["classifier"].model_dump(),
+        "debate": out["debate"].model_dump(),
+        "combined": out["combine"].model_dump(),
+        "roles": {
+            name: out[name].model_dump() if isinstance(out[name], BaseModel) else out[name]
+            for name in ROLE_NAMES
+        },
+        "routing": {"mode": routing, "ran": list(out["roles"]), "classifier": out["classifier"]._source},
+        # Roles dropped at their hard deadline or after failing; debate/combine ran without them
+        "degraded": {
+            status: [name for name in ROLE_NAMES if isinstance(out[name], dict) and out[name].get("status") == status]
+            for status in ("timed_out", "failed")
+        },
+        "schedule": report.as_dict(),
     }
-
@@ -0,0 +1,93 @@
+# Follow-up questions on a previous run
+# What this file contains:
+# - run_followup(): a refined question against a retained run (app/services/sessions.py); one fast
+#   Followup agent call decides which role outputs are still valid, those are reused, the rest (and
+#   debate → combine → format) run again
+# - UnknownRun: the parent run ID is unknown or has been evicted
+
+from app.agents import profiles
+from app.agents.roles import followup_agent
+from app.schemas.classifier import ClassifierSchema
+from app.schemas.followup import FollowupSchema
+from app.services.sessions import SessionRun, sessions
+from app.utils.metrics import registry
+from app.workflow.engine import ROLE_NAMES, ROLE_SPECS, _json, run_workflow
+
+REUSED = registry.counter("zylox_followup_stages_total", "Follow-up role/classifier stages by outcome (reused/regenerated)",
+                          ("stage", "outcome"))
+
+_SCHEMAS = {name: schema for name, _, schema in ROLE_SPECS}
+
+# First line of each role's main free-text field, for the relevance prompt
+_SUMMARY_FIELDS = ("summary", "market_impact", "execution_steps", "strategic_implications", "metrics_summary",
+                   "financial_projection")
+
+class UnknownRun(Exception):
+    pass
+
+def _summaries(prev: SessionRun) -> dict[str, str]:
+    out = {}
+    for role, answer in prev.roles.items():
+        if "status" in answer:
+            continue
+        text = next((answer[f] for f in _SUMMARY_FIELDS if isinstance(answer.get(f), str)), "")
+        out[role] = text.strip().split("\n")[0][:200]
+    return out
+
+async def _relevance(prev: SessionRun, question: str) -> FollowupSchema:
+    summaries = _summaries(prev)
+    user = (
+        f"Previous question: {prev.question}\n"
+        f"Previous role answers: {summaries}\n"
+        f"Follow-up question: {question}\n"
+        f"Roles: {', '.join(ROLE_NAMES)}"
+    )
+    try:
+        return await _json(followup_agent, followup_agent.instructions, user, FollowupSchema)
+    except Exception as e:
+        # Can't tell what changed: redo everything, with the previous question as context
+        return FollowupSchema(standalone_question=f"{prev.question}\nFollow-up: {question}", regenerate=list(ROLE_NAMES),
+                              reclassify=True, reason=f"relevance check failed ({type(e).__name__})")
+
+async def run_followup(parent_id: str, question: str, routing: str | None = None, profile: str | None = None,
+                       run_id: str | None = None) -> dict:
+    prev: SessionRun | None = sessions.get(parent_id)
+    if prev is None:
+        raise UnknownRun(f"Run {parent_id} is unknown or no longer retained")
+    profile = profile or prev.profile
+    models: dict[str, dict] = {}
+    token = profiles.current_profile.set((profile, models))
+    try:
+        decision = await _relevance(prev, question)
+    finally:
+        profiles.current_profile.reset(token)
+    regenerate = {r for r in decision.regenerate if r in ROLE_NAMES}
+    reuse = {
+        role: _SCHEMAS[role].model_validate(answer)
+        for role, answer in prev.roles.items()
+        if role not in regenerate and "status" not in answer
+    }
+    weights = ClassifierSchema.model_validate(prev.weights)
+    weights._source = "reused"
+
+    async def prior_weights() -> ClassifierSchema:
+        return weights
+
+    result = await run_workflow(
+        decision.standalone_question, routing=routing or prev.routing, run_id=run_id,
+        classifier=None if decision.reclassify else prior_weights,
+        profile=profile, reuse=reuse, parent=parent_id,
+    )
+    result["profile"]["models"].update(models)  # the relevance check's model
+    reused = [*([] if decision.reclassify else ["classifier"]), *reuse]
+    for stage in ["classifier", *ROLE_NAMES]:
+        REUSED.inc(stage=stage, outcome="reused" if stage in reused else "regenerated")
+    result["followup"] = {
+        "parent": parent_id,
+        "question": question,
+        "standalone_question": decision.standalone_question,
+        "reused": reused,
+        "regenerated": [s for s in ["classifier", *ROLE_NAMES] if s not in reused],
+        "reason": decision.reason,
+    }
+    return result
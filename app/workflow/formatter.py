@@ -0,0 +1,76 @@
+# Deterministic local formatter (CombinerSchema → FormatterSchema)
+# What this file contains:
+# - format_local(): pure-Python replacement for the Formatter agent
+# - Enforces the FORMATTER_SYS limits: title ≤60, tldr ≤160, bullets ≤120 chars, ≤5 bullets per list,
+#   due dates as "Nd" (default 14d), confidence ≤0.5 when data was missing
+
+import re
+from app.schemas.combined import CombinerSchema, FormatterSchema, NextTaskItem
+from app.utils.text import clip
+
+TITLE_MAX = 60
+TLDR_MAX = 160
+BULLET_MAX = 120
+MAX_BULLETS = 5
+DEFAULT_DUE = "14d"
+MISSING_DATA_CONFIDENCE = 0.5
+
+_WS = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def _first_sentence(text: str) -> str:
+    return _SENTENCE_END.split(_WS.sub(" ", text).strip(), maxsplit=1)[0]
+
+def _bullets(items: list[str]) -> list[str]:
+    out: list[str] = []
+    for item in items:
+        b = clip(item, BULLET_MAX)
+        if b and b not in out:
+            out.append(b)
+        if len(out) == MAX_BULLETS:
+            break
+    return out
+
+def _metrics(answers: dict | None) -> list[str]:
+    # The combiner has no metrics field; pull them from the roles that produce them
+    answers = answers or {}
+    return [
+        *answers.get("marketing", {}).get("metrics", []),
+        *answers.get("analyst", {}).get("guardrails", []),
+        *answers.get("finance", {}).get("budget_gates", []),
+    ]
+
+def format_local(combined: CombinerSchema, answers: dict | None = None) -> FormatterSchema:
+    """Map the combiner decision onto FormatterSchema. Raises ValueError if there is no answer to format."""
+    answer = _WS.sub(" ", combined.direct_answer).strip()
+    if not answer:
+        raise ValueError("Combiner returned an empty direct_answer")
+
+    headline = _first_sentence(answer)
+    paragraphs = [answer]
+    if combined.why:
+        paragraphs.append("Why: " + " ".join(b if b[-1] in ".!?…" else b + "." for b in _bullets(combined.why)))
+
+    missing = _bullets(combined.data_requests)
+    confidence = combined.confidence
+    if missing:
+        confidence = min(confidence, MISSING_DATA_CONFIDENCE)
+
+    return FormatterSchema(
+        title=clip(headline.rstrip(".!?"), TITLE_MAX),
+        tldr=clip(headline, TLDR_MAX),
+        decision="\n\n".join(paragraphs),
+        next=[
+            NextTaskItem(
+                owner=clip(s.owner, BULLET_MAX) or "Owner TBD",
+                task=clip(s.step, BULLET_MAX),
+                due=f"{s.due_days}d" if s.due_days > 0 else DEFAULT_DUE,
+            )
+            for s in combined.next_steps[:MAX_BULLETS]
+        ],
+        risks=_bullets(combined.risks),
+        assumptions=_bullets([f"Data not provided: {m}" for m in missing]),
+        metrics_to_watch=_bullets(_metrics(answers)),
+        confidence=confidence,
+        provenance=_bullets(combined.provenance),
+    )
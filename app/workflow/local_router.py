@@ -0,0 +1,220 @@
+# Local fast-path router: predicts classifier weights from similar past questions (no model call)
+# What this file contains:
+# - RouterIndex: hashed TF-IDF vectors of past questions as a NumPy inverted index (postings per hash
+#   bucket), the normalized weights each one got from the Classifier, and its top_k roles as a bitmask
+# - predict(): kNN over the index; the similarity-weighted mean of the neighbours' weights through
+#   ClassifierSchema.normalized(), or None when the match is weak or the neighbours disagree
+#   (→ classifier_agent)
+# - train(): builds an index from the run ledger's classifier outputs (runs the local router answered
+#   itself are skipped) and atomically swaps it in
+# - CLI: python -m app.workflow.local_router train
+#
+# On-disk layout: {ROUTER_DIR}/current -> v{timestamp}/
+#   meta.json   {"count", "dims", "trained_at"}
+#   idf.f32     (dims,) inverse document frequency per hash bucket
+#   ptr.i32     (dims + 1,) postings offsets;  docs.i32 / vals.f32: (question row, tf-idf weight) postings
+#   weights.f32 (count, 6) classifier weights (WEIGHT_KEYS order);  top_k.u8 (count,) role bitmask
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import zlib
+import numpy as np
+from app.core.config import settings
+from app.schemas.classifier import ClassifierSchema, WEIGHT_KEYS
+from app.services.answer_cache import normalize_question
+from app.tools.rerank import tokens
+from app.utils.metrics import registry
+
+log = logging.getLogger("local_router")
+
+_DIMS = 1 << 18
+_SOLO_SIMILARITY = 0.9  # one neighbour shows no agreement: answer from it alone only for a near-paraphrase
+
+ROUTER_DECISIONS = registry.counter("zylox_router_decisions_total",
+                                    "Classifier stage decisions by source (local = fast-path router, llm = Classifier agent, reused = follow-up)", ("source",))
+registry.gauge(
+    "zylox_router_local_fraction", "Share of classifier decisions served by the local router",
+    fn=lambda: {(): _local_fraction()},
+)
+
+def _local_fraction() -> float:
+    """Local decisions / (local + Classifier agent) decisions; reused follow-up weights don't count."""
+    counts = {key[0]: v for key, v in ROUTER_DECISIONS._values.items()}
+    total = counts.get("local", 0) + counts.get("llm", 0)
+    return counts.get("local", 0) / total if total else 0.0
+
+def stats() -> dict:
+    counts = {key[0]: int(v) for key, v in ROUTER_DECISIONS._values.items()}
+    index = get_router()
+    return {"decisions": counts, "local_fraction": round(_local_fraction(), 4),
+            "index": {"count": index.meta["count"], "trained_at": index.meta["trained_at"]} if index else None}
+
+def _features(question: str) -> dict[int, float]:
+    """Hashed unigram + bigram term frequencies of the normalized question."""
+    words = tokens(normalize_question(question))
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    tf: dict[int, float] = {}
+    for g in grams:
+        h = zlib.crc32(g.encode()) & (_DIMS - 1)
+        tf[h] = tf.get(h, 0.0) + 1.0
+    return tf
+
+class RouterIndex:
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        load = lambda name, dtype: np.fromfile(os.path.join(path, name), dtype=dtype)
+        self.idf = load("idf.f32", np.float32)
+        self.ptr = load("ptr.i32", np.int32)
+        self.docs = load("docs.i32", np.int32)
+        self.vals = load("vals.f32", np.float32)
+        self.weights = load("weights.f32", np.float32).reshape(-1, len(WEIGHT_KEYS))
+        self.top_k = load("top_k.u8", np.uint8)
+
+    def similarities(self, question: str) -> np.ndarray:
+        """Cosine similarity of the question to every indexed question."""
+        q = {h: tf * self.idf[h] for h, tf in _features(question).items() if self.idf[h] > 0}
+        norm = np.sqrt(sum(v * v for v in q.values()))
+        scores = np.zeros(self.meta["count"], dtype=np.float32)
+        if not norm:
+            return scores
+        for h, w in q.items():
+            lo, hi = self.ptr[h], self.ptr[h + 1]
+            np.add.at(scores, self.docs[lo:hi], self.vals[lo:hi] * (w / norm))
+        return scores
+
+    def predict(self, question: str, k: int, min_similarity: float, max_spread: float) -> ClassifierSchema | None:
+        scores = self.similarities(question)
+        k = min(k, len(scores))
+        if k == 0:
+            return None
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        sims = scores[top]
+        if sims[0] < min_similarity:
+            return None
+        top, sims = top[sims >= min_similarity * 0.75], sims[sims >= min_similarity * 0.75]  # drop weak tail neighbours
+        if len(top) == 1 and sims[0] < _SOLO_SIMILARITY:
+            return None
+        neighbours = self.weights[top]
+        mean = (neighbours * sims[:, None]).sum(axis=0) / sims.sum()
+        spread = float(np.abs(neighbours - mean).mean(axis=1).max())  # largest neighbour disagreement, weight points
+        if spread > max_spread:
+            return None
+        votes = np.array([[(int(m) >> i) & 1 for i in range(len(WEIGHT_KEYS))] for m in self.top_k[top]], dtype=np.float32)
+        share = (votes * sims[:, None]).sum(axis=0) / sims.sum()
+        top_k = [name for name, s in zip(WEIGHT_KEYS, share) if s >= 0.5] or [WEIGHT_KEYS[int(np.argmax(mean))]]
+        weights = ClassifierSchema(
+            **{name: float(w) for name, w in zip(WEIGHT_KEYS, mean)},
+            top_k=top_k,
+            routing_reason=f"Local router: {len(top)} similar past questions (best similarity {sims[0]:.2f})",
+            needs_data=[],
+        ).normalized()
+        weights._source = "local"
+        return weights
+
+_loaded: tuple[str, RouterIndex] | None = None
+_checked = 0.0
+
+def get_router() -> RouterIndex | None:
+    """The current index (re-read when `train` swaps it), or None if none has been trained."""
+    global _loaded, _checked
+    now = time.time()
+    if now - _checked > 30 or _loaded is None:
+        _checked = now
+        try:
+            target = os.path.realpath(os.path.join(settings.ROUTER_DIR, "current"), strict=True)
+        except OSError:
+            _loaded = None
+            return None
+        if _loaded is None or _loaded[0] != target:
+            try:
+                _loaded = (target, RouterIndex(target))
+            except (OSError, ValueError, KeyError) as e:
+                log.warning("Router index unreadable, using the Classifier agent: %s", e)
+                _loaded = None
+    return _loaded[1] if _loaded else None
+
+def predict(question: str) -> ClassifierSchema | None:
+    """Confident local weights for the question, or None (→ classifier_agent)."""
+    if not settings.ROUTER_ENABLED:
+        return None
+    index = get_router()
+    if index is None:
+        return None
+    try:
+        return index.predict(question, settings.ROUTER_K, settings.ROUTER_MIN_SIMILARITY, settings.ROUTER_MAX_SPREAD)
+    except Exception as e:  # never fail a run over the fast path
+        log.warning("Local router failed: %s", e)
+        return None
+
+def build(examples: list[tuple[str, dict]], path: str):
+    """Write an index for (question, classifier output) pairs to `path`."""
+    rows = [_features(q) for q, _ in examples]
+    df = np.zeros(_DIMS, dtype=np.float32)
+    for tf in rows:
+        df[list(tf)] += 1
+    n = len(rows)
+    idf = np.where(df > 0, np.log((1 + n) / (1 + df)) + 1, 0).astype(np.float32)
+    postings: list[tuple[int, int, float]] = []
+    for r, tf in enumerate(rows):
+        vec = {h: c * idf[h] for h, c in tf.items()}
+        norm = np.sqrt(sum(v * v for v in vec.values())) or 1.0
+        postings += [(h, r, v / norm) for h, v in vec.items()]
+    postings.sort()
+    buckets = np.array([h for h, _, _ in postings], dtype=np.int64)
+    ptr = np.searchsorted(buckets, np.arange(_DIMS + 1)).astype(np.int32)
+
+    os.makedirs(path)
+    idf.tofile(os.path.join(path, "idf.f32"))
+    ptr.tofile(os.path.join(path, "ptr.i32"))
+    np.array([r for _, r, _ in postings], dtype=np.int32).tofile(os.path.join(path, "docs.i32"))
+    np.array([v for _, _, v in postings], dtype=np.float32).tofile(os.path.join(path, "vals.f32"))
+    np.array([[out[k] for k in WEIGHT_KEYS] for _, out in examples], dtype=np.float32).tofile(os.path.join(path, "weights.f32"))
+    masks = []
+    for _, out in examples:
+        picked = {str(r).strip().lower() for r in out.get("top_k") or []}
+        masks.append(sum(1 << i for i, name in enumerate(WEIGHT_KEYS) if name in picked))
+    np.array(masks, dtype=np.uint8).tofile(os.path.join(path, "top_k.u8"))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"count": n, "dims": _DIMS, "trained_at": time.time()}, f)
+
+async def train() -> str | None:
+    """Build a new index from the ledger and swap it in; returns its directory (None if too few examples)."""
+    from app.services.ledger import ledger
+    latest: dict[str, tuple[str, dict]] = {}
+    async for record in ledger.export():
+        stage = record.stages.get("classifier")
+        source = (record.stages.get("router") or (None, {}))[1].get("source")
+        if stage is None or source not in ("llm", None):
+            continue  # only the Classifier agent's own decisions are ground truth
+        latest[normalize_question(record.question)] = (record.question, stage[1])
+    examples = list(latest.values())
+    if len(examples) < settings.ROUTER_MIN_EXAMPLES:
+        log.warning("Only %d classifier examples in the ledger (need %d); index not updated",
+                    len(examples), settings.ROUTER_MIN_EXAMPLES)
+        return None
+    version = os.path.join(settings.ROUTER_DIR, f"v{int(time.time() * 1000)}")
+    build(examples, version)
+    tmp_link = os.path.join(settings.ROUTER_DIR, "current.tmp")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.basename(version), tmp_link)
+    os.replace(tmp_link, os.path.join(settings.ROUTER_DIR, "current"))
+    for old in sorted(d for d in os.listdir(settings.ROUTER_DIR) if d.startswith("v"))[:-2]:
+        shutil.rmtree(os.path.join(settings.ROUTER_DIR, old), ignore_errors=True)
+    log.info("Router index: %d questions → %s", len(examples), version)
+    return version
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Local fast-path router")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("train", help="(re)build the index from the run ledger's classifier outputs")
+    parser.parse_args()
+    asyncio.run(train())
@@ -0,0 +1,64 @@
+# Resuming a failed run from its ledger checkpoints
+# What this file contains:
+# - resume_run(): reloads the stage outputs recorded for a run (app/services/ledger.py) and runs the workflow
+#   again under the same run ID; only stages without a recorded output run (e.g. a failed combine or format)
+# - RunInProgress: the run is still running in this process; RunFinished: it already finished ok
+#
+# Roles recorded as timed out / failed are tried again when the stages after them have to run anyway
+# (no recorded "roles" output), e.g. a run where every role failed.
+
+from pydantic import ValidationError
+from app.agents import profiles
+from app.services.ledger import ledger
+from app.utils.metrics import registry
+from app.utils.progress import bus
+from app.workflow.engine import ROLE_NAMES, STAGE_SCHEMAS, run_workflow
+from app.workflow.followup import UnknownRun
+
+RESUMED = registry.counter("zylox_resumed_stages_total", "Stages of resumed runs by outcome (restored/rerun)", ("outcome",))
+
+_resuming: set[str] = set()
+
+class RunInProgress(Exception):
+    pass
+
+class RunFinished(Exception):
+    pass
+
+_RETRYABLE = ("timed_out", "failed")
+
+async def resume_run(run_id: str) -> dict:
+    record = await ledger.get(run_id)
+    if record is None:
+        raise UnknownRun(f"Run {run_id} is not in the ledger")
+    channel = bus.get(run_id)
+    if run_id in _resuming or (record.status == "running" and channel is not None and not channel.closed):
+        raise RunInProgress(f"Run {run_id} is still running")
+    if record.status == "ok":
+        raise RunFinished(f"Run {run_id} already finished")
+    restore = {}
+    for stage, (kind, value) in record.stages.items():
+        if kind == "model":
+            try:
+                value = STAGE_SCHEMAS[stage].model_validate(value)
+            except (KeyError, ValidationError):
+                continue  # schema changed since it was recorded: run the stage again
+        restore[stage] = value
+    if "roles" not in restore:
+        for role in ROLE_NAMES:
+            if isinstance(restore.get(role), dict) and restore[role].get("status") in _RETRYABLE:
+                del restore[role]
+    _resuming.add(run_id)
+    try:
+        result = await run_workflow(
+            record.question, routing=record.routing, run_id=run_id,
+            profile=record.profile if record.profile in profiles.profiles else None,
+            parent=record.parent, restore=restore,
+        )
+    finally:
+        _resuming.discard(run_id)
+    rerun = [stage for stage in result["schedule"]["stages"] if stage not in restore]
+    RESUMED.inc(len(restore), outcome="restored")
+    RESUMED.inc(len(rerun), outcome="rerun")
+    result["resumed"] = {"attempt": record.attempts + 1, "restored": sorted(restore), "rerun": rerun}
+    return result
@@ -0,0 +1,43 @@
+# Classifier-driven role pruning
+# What this file contains:
+# - ROUTING_MODES: "all" (fan out to every role), "top_k" (roles the router listed), "threshold" (weight floor)
+# - select_roles(): which role agents to run for a normalized ClassifierSchema
+
+from app.schemas.classifier import ClassifierSchema, WEIGHT_KEYS
+
+ROUTING_MODES = ("all", "top_k", "threshold")
+
+# The router is free-text in top_k; map the spellings it tends to use onto role names
+_ALIASES = {
+    "ops": "operations",
+    "operation": "operations",
+    "analytics": "analyst",
+    "analysis": "analyst",
+    "compliance": "legal",
+    "financial": "finance",
+}
+
+def _role_name(raw: str) -> str | None:
+    name = raw.strip().lower()
+    name = _ALIASES.get(name, name)
+    return name if name in WEIGHT_KEYS else None
+
+def _above_floor(weights: ClassifierSchema, floor: float) -> list[str]:
+    vals = weights.model_dump()
+    picked = [k for k in WEIGHT_KEYS if vals[k] >= floor]
+    # Never route to nothing: keep the single heaviest role
+    return picked or [max(WEIGHT_KEYS, key=lambda k: vals[k])]
+
+def select_roles(weights: ClassifierSchema, mode: str, floor: float) -> list[str]:
+    """Return the roles to run, in WEIGHT_KEYS order. Expects weights already normalized()."""
+    if mode == "all":
+        return list(WEIGHT_KEYS)
+    if mode == "top_k":
+        wanted = {n for n in (_role_name(r) for r in weights.top_k) if n}
+        if wanted:
+            return [k for k in WEIGHT_KEYS if k in wanted]
+        # Unusable top_k (empty or unknown names): fall back to the weight floor
+        return _above_floor(weights, floor)
+    if mode == "threshold":
+        return _above_floor(weights, floor)
+    raise ValueError(f"Unknown routing mode: {mode!r}")
@@ -0,0 +1,125 @@
+# Dependency-driven stage scheduler
+# What this file contains:
+# - Stage: a named async step plus the stages whose outputs it consumes
+# - run_stages(): starts every stage as soon as its dependencies are done (asyncio tasks)
+# - ScheduleReport: per-stage timings and the critical path of the run
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+StageFn = Callable[[dict[str, Any]], Awaitable[Any]]
+
+@dataclass
+class Stage:
+    name: str
+    fn: StageFn  # receives {dep_name: dep_output}
+    deps: tuple[str, ...] = ()
+
+@dataclass
+class StageTiming:
+    name: str
+    deps: tuple[str, ...]
+    start: float  # seconds since run start; a stage starts as soon as its deps are done
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+@dataclass
+class ScheduleReport:
+    total: float
+    timings: dict[str, StageTiming] = field(default_factory=dict)
+    critical_path: list[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_ms": round(self.total * 1000, 1),
+            "critical_path": self.critical_path,
+            "stages": {
+                name: {
+                    "deps": list(t.deps),
+                    "start_ms": round(t.start * 1000, 1),
+                    "end_ms": round(t.end * 1000, 1),
+                    "duration_ms": round(t.duration * 1000, 1),
+                }
+                for name, t in sorted(self.timings.items(), key=lambda kv: kv[1].start)
+            },
+        }
+
+def _check_graph(stages: list[Stage]) -> None:
+    names = [s.name for s in stages]
+    if len(names) != len(set(names)):
+        raise ValueError("Duplicate stage names")
+    known = set(names)
+    for s in stages:
+        missing = [d for d in s.deps if d not in known]
+        if missing:
+            raise ValueError(f"Stage {s.name!r} depends on unknown stages: {missing}")
+
+    # Kahn's algorithm: anything left over sits on a cycle
+    indegree = {s.name: len(s.deps) for s in stages}
+    dependents: dict[str, list[str]] = {s.name: [] for s in stages}
+    for s in stages:
+        for d in s.deps:
+            dependents[d].append(s.name)
+    ready = [n for n, deg in indegree.items() if deg == 0]
+    seen = 0
+    while ready:
+        n = ready.pop()
+        seen += 1
+        for m in dependents[n]:
+            indegree[m] -= 1
+            if indegree[m] == 0:
+                ready.append(m)
+    if seen != len(stages):
+        cyclic = sorted(n for n, deg in indegree.items() if deg > 0)
+        raise ValueError(f"Stage graph has a cycle through: {cyclic}")
+
+def _critical_path(timings: dict[str, StageTiming]) -> list[str]:
+    """Walk back from the last stage to finish, always following the dependency that finished last."""
+    if not timings:
+        return []
+    node = max(timings.values(), key=lambda t: t.end)
+    path = [node.name]
+    while node.deps:
+        node = max((timings[d] for d in node.deps), key=lambda t: t.end)
+        path.append(node.name)
+    return list(reversed(path))
+
+async def run_stages(stages: list[Stage]) -> tuple[dict[str, Any], ScheduleReport]:
+    """Run a stage graph with maximum overlap. Returns ({stage: output}, report).
+    The first stage to raise cancels everything still running and its exception propagates.
+    """
+    _check_graph(stages)
+    t0 = time.perf_counter()
+    timings: dict[str, StageTiming] = {}
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def _run(stage: Stage):
+        inputs = {d: await tasks[d] for d in stage.deps}
+        start = time.perf_counter() - t0
+        out = await stage.fn(inputs)
+        timings[stage.name] = StageTiming(stage.name, stage.deps, start, time.perf_counter() - t0)
+        return out
+
+    # Dependencies are awaited inside each task, so creation order does not matter
+    for stage in stages:
+        tasks[stage.name] = asyncio.create_task(_run(stage), name=f"stage:{stage.name}")
+
+    try:
+        done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+        for t in done:
+            if not t.cancelled() and t.exception() is not None:
+                raise t.exception()
+    finally:
+        for t in tasks.values():
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    report = ScheduleReport(total=time.perf_counter() - t0, timings=timings)
+    report.critical_path = _critical_path(timings)
+    return {name: t.result() for name, t in tasks.items()}, report
@@ -0,0 +1,36 @@
+# Token streaming of the combiner / formatter answers to the progress bus
+# What this file contains:
+# - FieldStreamer: the on_text callback for a streamed agent run; parses the partial JSON
+#   (app/utils/partial_json.py) and emits "{stage}:delta" events with the new text of the selected
+#   fields, batched to at most one event per field every STREAM_FLUSH_MS (and always on completion)
+
+import time
+from app.core.config import settings
+from app.utils.partial_json import JSONFieldStream
+from app.utils.progress import emit
+
+class FieldStreamer:
+    def __init__(self, stage: str, fields: tuple[str, ...]):
+        self.stage = stage
+        self._parser = JSONFieldStream(fields)
+        self._pending: dict[str, str] = {}
+        self._last_flush = time.perf_counter()
+        self.first_delta_s: float | None = None  # time to first field text, for the stage's end event
+        self._t0 = self._last_flush
+
+    async def __call__(self, delta: str):
+        finished = []
+        for field, text, done in self._parser.feed(delta):
+            self._pending[field] = self._pending.get(field, "") + text
+            if done:
+                finished.append(field)
+        if self._pending and self.first_delta_s is None:
+            self.first_delta_s = time.perf_counter() - self._t0
+        if finished or time.perf_counter() - self._last_flush >= settings.STREAM_FLUSH_MS / 1000:
+            await self.flush()
+
+    async def flush(self):
+        for field, text in self._pending.items():
+            await emit(f"{self.stage}:delta", {"field": field, "text": text, "done": field in self._parser.done})
+        self._pending = {}
+        self._last_flush = time.perf_counter()
@@ -0,0 +1,290 @@
+# Local stand-in for the OpenAI endpoints the workflow uses (no credits spent)
+# What this file contains:
+# - POST /v1/responses and /v1/chat/completions: schema-valid JSON for whatever json_schema the
+#   Agents SDK sends (so every agent in app/agents/roles.py gets a valid structured output);
+#   agents with tools get one function call first, then the answer, like a real tool round trip;
+#   /v1/responses with "stream": true sends the answer as SSE output_text deltas (Runner.run_streamed)
+# - POST /v1/vector_stores/{id}/search and /v1/embeddings: synthetic results / deterministic vectors
+# - GET /v1/vector_stores/{id}/files, .../files/{file_id}/content and /v1/files/{file_id}: a few synthetic
+#   documents per store, so `python -m app.tools.mirror sync` can run offline
+# - FakeConfig: log-normal latency per endpoint kind, plus error and 429 injection rates
+# Run standalone: python -m bench.fake_openai --port 8100   (then OPENAI_BASE_URL=http://127.0.0.1:8100/v1)
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ROLE_NAMES = ["legal", "marketing", "operations", "strategy", "analyst", "finance"]
+WORDS = ("market", "pilot", "compliance", "pricing", "channel", "runway", "margin", "launch", "risk",
+         "partner", "segment", "budget", "contract", "retention", "forecast", "hiring", "vendor")
+
+@dataclass
+class FakeConfig:
+    model_median_ms: float = 1500.0
+    model_sigma: float = 0.5  # log-normal shape; p99 ≈ median * e^(2.33σ)
+    search_median_ms: float = 150.0
+    search_sigma: float = 0.4
+    embed_median_ms: float = 60.0
+    error_rate: float = 0.0  # fraction of calls answered with 500
+    rate_429: float = 0.0  # fraction of calls answered with 429 + Retry-After
+    stream_token_ms: float = 0.0  # delay per streamed ~4-character delta (after the model latency)
+    seed: int | None = None
+
+config = FakeConfig()
+app = FastAPI(title="Fake OpenAI (bench)")
+
+async def _latency(median_ms: float, sigma: float):
+    if median_ms > 0:
+        await asyncio.sleep(random.lognormvariate(math.log(median_ms / 1000), sigma))
+
+def _injected_error() -> JSONResponse | None:
+    r = random.random()
+    if r < config.rate_429:
+        return JSONResponse({"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+                            status_code=429, headers={"retry-after-ms": "250"})
+    if r < config.rate_429 + config.error_rate:
+        return JSONResponse({"error": {"message": "Injected server error (fake)", "type": "server_error"}}, status_code=500)
+    return None
+
+def _sentence(n: int = 8) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+def _sample(schema: dict, defs: dict, name: str = "") -> object:
+    """Generate a value that validates against a (strict-mode) JSON schema."""
+    if "$ref" in schema:
+        return _sample(defs[schema["$ref"].split("/")[-1]], defs, name)
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"] or schema["anyOf"]
+        return _sample(options[0], defs, name)
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object":
+        return {k: _sample(v, defs, k) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        if name in ("top_k", "regenerate"):
+            return random.sample(ROLE_NAMES, 3)
+        return [_sample(schema.get("items", {}), defs, name) for _ in range(random.randint(2, 4))]
+    if kind == "string":
+        text = _sentence(random.randint(4, 14))
+        return text[: schema["maxLength"]] if "maxLength" in schema else text
+    if kind in ("number", "integer"):
+        lo = schema.get("minimum", 0)
+        hi = schema.get("maximum", 1 if kind == "number" and name in ("confidence", "weight_impact") else 60)
+        return random.randint(int(lo), int(hi)) if kind == "integer" else round(random.uniform(lo, hi), 2)
+    if kind == "boolean":
+        return random.random() < 0.5
+    return None
+
+_NUMBERED = re.compile(r"^\d+\. ", re.M)
+
+def _structured(schema: dict | None, prompt: str = "") -> str:
+    if not schema:
+        return _sentence(20)
+    value = _sample(schema, schema.get("$defs", {}))
+    if set(schema.get("properties", {})) == {"items"} and (n := len(_NUMBERED.findall(prompt))):
+        # Batched classifier: one item per numbered question, like the real model
+        item = schema["properties"]["items"]["items"]
+        value["items"] = [_sample(item, schema.get("$defs", {})) for _ in range(n)]
+    return json.dumps(value, ensure_ascii=False)
+
+def _usage(prompt: str, completion: str) -> tuple[int, int]:
+    return max(1, len(prompt) // 4), max(1, len(completion) // 4)
+
+def _input_text(items) -> str:
+    if isinstance(items, str):
+        return items
+    parts = []
+    for i in items or []:
+        content = i.get("content") if isinstance(i, dict) else None
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts += [c.get("text", "") for c in content if isinstance(c, dict)]
+    return "\n".join(parts)
+
+def _has_tool_output(items) -> bool:
+    if not isinstance(items, list):
+        return False
+    return any(isinstance(i, dict) and i.get("type") == "function_call_output" for i in items)
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    body = await request.json()
+    await _latency(config.model_median_ms, config.model_sigma)
+    if (err := _injected_error()) is not None:
+        return err
+
+    tools = [t for t in body.get("tools") or [] if t.get("type") == "function"]
+    fmt = (body.get("text") or {}).get("format") or {}
+    schema = fmt.get("schema") if fmt.get("type") == "json_schema" else None
+    if tools and not _has_tool_output(body.get("input")):
+        # First turn of a tool-using agent: ask for its retrieval tool, like the real model does
+        text = json.dumps({"question": _sentence(8)})
+        output = [{"type": "function_call", "id": f"fc_{uuid.uuid4().hex}", "call_id": f"call_{uuid.uuid4().hex}",
+                   "name": tools[0]["name"], "arguments": text, "status": "completed"}]
+    else:
+        text = _structured(schema, _input_text(body.get("input")))
+        output = [{"type": "message", "id": f"msg_{uuid.uuid4().hex}", "role": "assistant", "status": "completed",
+                   "content": [{"type": "output_text", "text": text, "annotations": []}]}]
+    tin, tout = _usage(json.dumps(body.get("input")) + (body.get("instructions") or ""), text)
+    response = {
+        "id": f"resp_{uuid.uuid4().hex}", "object": "response", "created_at": int(time.time()),
+        "model": body.get("model", "fake"), "status": "completed", "output": output,
+        "parallel_tool_calls": bool(body.get("parallel_tool_calls")), "tool_choice": body.get("tool_choice", "auto"),
+        "tools": body.get("tools") or [], "text": body.get("text") or {"format": {"type": "text"}},
+        "usage": {"input_tokens": tin, "input_tokens_details": {"cached_tokens": 0},
+                  "output_tokens": tout, "output_tokens_details": {"reasoning_tokens": 0},
+                  "total_tokens": tin + tout},
+    }
+    if body.get("stream"):
+        return StreamingResponse(_stream_response(response), media_type="text/event-stream")
+    return response
+
+async def _stream_response(response: dict):
+    seq = iter(range(1_000_000))
+
+    def event(kind: str, **data) -> str:
+        return f"event: {kind}\ndata: {json.dumps({'type': kind, 'sequence_number': next(seq), **data})}\n\n"
+
+    yield event("response.created", response={**response, "status": "in_progress", "output": []})
+    for index, item in enumerate(response["output"]):
+        if item["type"] == "message":
+            text = item["content"][0]["text"]
+            yield event("response.output_item.added", output_index=index, item={**item, "status": "in_progress", "content": []})
+            for i in range(0, len(text), 4):
+                if config.stream_token_ms > 0:
+                    await asyncio.sleep(config.stream_token_ms / 1000)
+                yield event("response.output_text.delta", item_id=item["id"], output_index=index, content_index=0,
+                            delta=text[i:i + 4], logprobs=[])
+            yield event("response.output_text.done", item_id=item["id"], output_index=index, content_index=0,
+                        text=text, logprobs=[])
+        yield event("response.output_item.done", output_index=index, item=item)
+    yield event("response.completed", response=response)
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await _latency(config.model_median_ms, config.model_sigma)
+    if (err := _injected_error()) is not None:
+        return err
+
+    tools = body.get("tools") or []
+    rf = body.get("response_format") or {}
+    schema = (rf.get("json_schema") or {}).get("schema") if rf.get("type") == "json_schema" else None
+    tool_done = any(m.get("role") == "tool" for m in body.get("messages", []))
+    if tools and not tool_done:
+        message = {"role": "assistant", "content": None, "tool_calls": [{
+            "id": f"call_{uuid.uuid4().hex}", "type": "function",
+            "function": {"name": tools[0]["function"]["name"], "arguments": json.dumps({"question": _sentence(8)})}}]}
+        finish, text = "tool_calls", ""
+    else:
+        text = _structured(schema, "\n".join(str(m.get("content") or "") for m in body.get("messages", [])))
+        message = {"role": "assistant", "content": text}
+        finish = "stop"
+    tin, tout = _usage(json.dumps(body.get("messages")), text)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+        "usage": {"prompt_tokens": tin, "completion_tokens": tout, "total_tokens": tin + tout},
+    }
+
+@app.post("/v1/vector_stores/{store_id}/search")
+async def vector_store_search(store_id: str, request: Request):
+    body = await request.json()
+    await _latency(config.search_median_ms, config.search_sigma)
+    if (err := _injected_error()) is not None:
+        return err
+    k = int(body.get("max_num_results") or 10)
+    data = [{
+        "file_id": f"file_{store_id}_{i}", "filename": f"{store_id}_doc_{i}.md", "score": round(1 - i * 0.05, 3),
+        "attributes": {}, "content": [{"type": "text", "text": _sentence(40)}],
+    } for i in range(k)]
+    return {"object": "vector_store.search_results.page", "search_query": body.get("query"),
+            "data": data, "has_more": False, "next_page": None}
+
+FILES_PER_STORE = 8
+
+@app.get("/v1/vector_stores/{store_id}/files")
+async def vector_store_files(store_id: str):
+    data = [{"id": f"file_{store_id}_{i}", "object": "vector_store.file", "created_at": 0, "usage_bytes": 0,
+             "vector_store_id": store_id, "status": "completed", "last_error": None} for i in range(FILES_PER_STORE)]
+    return {"object": "list", "data": data, "first_id": data[0]["id"], "last_id": data[-1]["id"], "has_more": False}
+
+@app.get("/v1/vector_stores/{store_id}/files/{file_id}/content")
+async def vector_store_file_content(store_id: str, file_id: str):
+    rng = random.Random(file_id)
+    text = "\n\n".join(" ".join(rng.choice(WORDS) for _ in range(60)) + "." for _ in range(12))
+    return {"object": "vector_store.file_content.page", "data": [{"type": "text", "text": text}],
+            "has_more": False, "next_page": None}
+
+@app.get("/v1/files/{file_id}")
+async def file_meta(file_id: str):
+    return {"id": file_id, "object": "file", "bytes": 0, "created_at": 0, "filename": f"{file_id}.md",
+            "purpose": "assistants", "status": "processed"}
+
+@app.get("/v1/models")
+async def models():
+    await _latency(5, 0.3)
+    return {"object": "list", "data": [{"id": "fake-model", "object": "model", "created": 0, "owned_by": "bench"}]}
+
+def _vector(text: str, dim: int) -> np.ndarray:
+    # Deterministic per text, so identical questions embed identically (exercises the answer cache)
+    seed = int.from_bytes(hashlib.sha1(text.encode()).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    await _latency(config.embed_median_ms, 0.3)
+    if (err := _injected_error()) is not None:
+        return err
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dim = int(body.get("dimensions") or 256)
+    data = []
+    for i, text in enumerate(inputs):
+        vec = _vector(str(text), dim)
+        emb = base64.b64encode(vec.tobytes()).decode() if body.get("encoding_format") == "base64" else vec.tolist()
+        data.append({"object": "embedding", "index": i, "embedding": emb})
+    return {"object": "list", "data": data, "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": 8 * len(inputs), "total_tokens": 8 * len(inputs)}}
+
+def add_config_args(p: argparse.ArgumentParser):
+    p.add_argument("--model-median-ms", type=float, default=config.model_median_ms)
+    p.add_argument("--model-sigma", type=float, default=config.model_sigma)
+    p.add_argument("--search-median-ms", type=float, default=config.search_median_ms)
+    p.add_argument("--search-sigma", type=float, default=config.search_sigma)
+    p.add_argument("--embed-median-ms", type=float, default=config.embed_median_ms)
+    p.add_argument("--error-rate", type=float, default=config.error_rate)
+    p.add_argument("--rate-429", type=float, default=config.rate_429)
+    p.add_argument("--stream-token-ms", type=float, default=config.stream_token_ms)
+    p.add_argument("--seed", type=int, default=None)
+
+def apply_config_args(args: argparse.Namespace):
+    for field in FakeConfig.__dataclass_fields__:
+        setattr(config, field, getattr(args, field))
+    if config.seed is not None:
+        random.seed(config.seed)
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Fake OpenAI server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_config_args(parser)
+    args = parser.parse_args()
+    apply_config_args(args)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,189 @@
+# Offline load driver for run_workflow
+# What this file contains:
+# - Drives run_workflow in-process at a fixed concurrency against the fake OpenAI server (bench/fake_openai.py)
+# - Reports end-to-end and per-stage p50/p95/p99, throughput, error count and memory per in-flight workflow
+# - Saves results as a JSON baseline and compares against a previous one (non-zero exit on regression)
+# Usage:
+#   python -m bench.load --requests 200 --concurrency 20 --out bench/baselines/local.json
+#   python -m bench.load --requests 200 --concurrency 20 --compare bench/baselines/local.json
+#   python -m bench.load --base-url http://127.0.0.1:8100/v1 ...   (use an already running fake server)
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from bench import fake_openai
+
+WORDS = ("Should we enter", "How do we price", "What would it take to launch", "Is it worth expanding",
+         "How fast can we scale", "What are the risks of")
+MARKETS = ("the US healthcare market", "Germany", "mid-market SaaS", "a usage-based plan",
+           "the public sector", "self-serve onboarding", "Latin America", "an enterprise tier")
+
+def _questions(n: int) -> list[str]:
+    return [f"{WORDS[i % len(WORDS)]} {MARKETS[(i // len(WORDS)) % len(MARKETS)]}? (bench #{i})" for i in range(n)]
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = (len(s) - 1) * p
+    lo, hi = int(k), min(int(k) + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+def _summary(values: list[float]) -> dict:
+    return {
+        "n": len(values),
+        "p50": round(_pct(values, 0.50), 2),
+        "p95": round(_pct(values, 0.95), 2),
+        "p99": round(_pct(values, 0.99), 2),
+        "mean": round(sum(values) / len(values), 2) if values else 0.0,
+    }
+
+def _start_fake_server(port: int) -> None:
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(fake_openai.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True, name="fake-openai").start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("fake OpenAI server did not start")
+        time.sleep(0.05)
+
+def _configure_env(base_url: str):
+    # Must happen before app.* is imported: settings are read at import time
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    for role in ("LEGAL", "MARKETING", "OPS", "STRATEGY", "ANALYST", "FINANCE"):
+        os.environ.setdefault(f"VECTOR_STORE_{role}", f"vs_bench_{role.lower()}")
+    os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")  # measure the workflow, not the cache
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+async def _drive(run_workflow, questions: list[str], concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    e2e: list[float] = []
+    stages: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+
+    async def one(q: str):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                result = await run_workflow(q)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                return
+            e2e.append((time.perf_counter() - t0) * 1000)
+            for name, st in result["schedule"]["stages"].items():
+                stages.setdefault(name, []).append(st["duration_ms"])
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    wall = time.perf_counter() - t0
+    return {
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(e2e) / wall, 3) if wall else 0.0,
+        "errors": errors,
+        "e2e_ms": _summary(e2e),
+        "stages_ms": {name: _summary(v) for name, v in sorted(stages.items())},
+    }
+
+async def _memory_per_workflow(run_workflow, concurrency: int) -> float:
+    """Peak traced allocation while `concurrency` workflows are in flight, divided by that count (KiB)."""
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    await asyncio.gather(*(run_workflow(q) for q in _questions(concurrency)), return_exceptions=True)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round((peak - base) / 1024 / max(concurrency, 1), 1)
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return human-readable regressions: latency up or throughput down by more than `tolerance`."""
+    problems = []
+
+    def check(label: str, cur: float, base: float, higher_is_worse: bool = True):
+        if not base:
+            return
+        change = (cur - base) / base
+        if (change > tolerance) if higher_is_worse else (-change > tolerance):
+            problems.append(f"{label}: {base} → {cur} ({change:+.1%})")
+
+    for p in ("p50", "p95", "p99"):
+        check(f"e2e {p}", current["e2e_ms"][p], baseline["e2e_ms"][p])
+    for name, cur in current["stages_ms"].items():
+        if name in baseline["stages_ms"]:
+            check(f"stage {name} p95", cur["p95"], baseline["stages_ms"][name]["p95"])
+    check("throughput_rps", current["throughput_rps"], baseline["throughput_rps"], higher_is_worse=False)
+    if current.get("memory_per_workflow_kib") and baseline.get("memory_per_workflow_kib"):
+        check("memory_per_workflow_kib", current["memory_per_workflow_kib"], baseline["memory_per_workflow_kib"])
+    return problems
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load test for run_workflow")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2, help="untimed runs before measuring")
+    parser.add_argument("--base-url", default=None, help="use a running fake server instead of starting one")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc phase")
+    parser.add_argument("--out", help="write results JSON here (a baseline)")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    fake_openai.add_config_args(parser)
+    args = parser.parse_args(argv)
+
+    base_url = args.base_url
+    if base_url is None:
+        fake_openai.apply_config_args(args)
+        _start_fake_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}/v1"
+    _configure_env(base_url)
+
+    from agents import set_tracing_disabled
+    from app.workflow.engine import run_workflow
+    set_tracing_disabled(True)  # don't export bench traces to the hosted dashboard
+
+    async def run() -> dict:
+        if args.warmup:
+            await asyncio.gather(*(run_workflow(q) for q in _questions(args.warmup)), return_exceptions=True)
+        results = await _drive(run_workflow, _questions(args.requests), args.concurrency)
+        if not args.no_memory:
+            results["memory_per_workflow_kib"] = await _memory_per_workflow(run_workflow, args.concurrency)
+        return results
+
+    results = asyncio.run(run())
+    results["meta"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": _git_rev(),
+        "python": platform.python_version(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "fake": {k: getattr(args, k) for k in fake_openai.FakeConfig.__dataclass_fields__} if args.base_url is None else None,
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())